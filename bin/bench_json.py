@@ -0,0 +1,110 @@
+import datetime
+import json
+import os
+import timeit
+import uuid
+
+from fastapi.encoders import jsonable_encoder
+
+import fastjson
+import schemas.recordings as schema
+import schemas.searches as searches
+
+# PYTHONPATH=src python bin/bench_json.py
+# per row cost of /recordings and per response cost of a search,
+# the old pydantic + jsonable_encoder path against fastjson
+
+NUM_ROWS = 5000
+NUM_UPDATES = 40
+
+
+def make_rows(n):
+	begin = datetime.datetime(2025, 4, 1, tzinfo=datetime.timezone.utc)
+	rows = []
+	for i in range(n):
+		rows.append(
+			{
+				"uuid": uuid.uuid4(),
+				"file_path": f"recording_{i}.opus",
+				"begin_date": begin + datetime.timedelta(hours=i),
+				"audio_length": datetime.timedelta(minutes=58, seconds=i % 60),
+				"source": "stationary",
+				"sha256sum": os.urandom(32).hex(),
+				"disk_usage": 1_000_000 + i,
+			}
+		)
+	return rows
+
+
+def make_search(n):
+	s = searches.Search()
+	begin = datetime.datetime(2025, 4, 1, tzinfo=datetime.timezone.utc)
+	for i in range(n):
+		prompt = searches.SearchPrompt(
+			prompt_timestamp=begin + datetime.timedelta(hours=i),
+			play_request=searches.PlayRecordingRequest(
+				recording_id=uuid.uuid4(),
+				offset=datetime.timedelta(seconds=i),
+				duration=datetime.timedelta(seconds=10),
+			),
+		)
+		s.updates.append(searches.SearchUpdate(prompt=prompt, result="after"))
+	return s
+
+
+def rows_before(rows):
+	page = schema.RecordingsPage(
+		recordings=[schema.Recording.model_validate(dict(r)) for r in rows]
+	)
+	return json.dumps(jsonable_encoder(page)).encode()
+
+
+def rows_after(rows):
+	return fastjson.dumps({"recordings": fastjson.rows(rows), "next_cursor": None})
+
+
+def columnar_after(rows):
+	return fastjson.dumps(
+		{
+			"recordings": fastjson.columns(
+				[tuple(r.values()) for r in rows], list(rows[0])
+			),
+			"next_cursor": None,
+		}
+	)
+
+
+def search_before(s):
+	# what response_model does with the returned model
+	validated = searches.Search.model_validate(s.model_dump())
+	return json.dumps(jsonable_encoder(validated)).encode()
+
+
+def search_after(s):
+	return s.model_dump_json().encode()
+
+
+def bench(name, fn, arg, per):
+	number = 5
+	best = min(timeit.repeat(lambda: fn(arg), number=number, repeat=5)) / number
+	print(f"{name:<20} {best * 1e6 / per:8.2f} us per {'row' if per > 1 else 'call'}")
+	return best
+
+
+def main():
+	rows = make_rows(NUM_ROWS)
+	print(f"/recordings, {NUM_ROWS} rows")
+	before = bench("pydantic", rows_before, rows, NUM_ROWS)
+	after = bench("fastjson", rows_after, rows, NUM_ROWS)
+	bench("fastjson columnar", columnar_after, rows, NUM_ROWS)
+	print(f"{before / after:.1f}x faster")
+
+	s = make_search(NUM_UPDATES)
+	print(f"/search/{{id}}, {NUM_UPDATES} updates")
+	before = bench("response_model", search_before, s, 1)
+	after = bench("model_dump_json", search_after, s, 1)
+	print(f"{before / after:.1f}x faster")
+
+
+if __name__ == "__main__":
+	main()
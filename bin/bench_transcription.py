@@ -0,0 +1,64 @@
+import os
+import shutil
+import tempfile
+
+from jobs import extract_text
+
+# PYTHONPATH=src python bin/bench_transcription.py
+# real time factor of the sharded transcription job for every split of
+# the cores into worker processes x torch threads, on the same sample of
+# recordings every time. outputs go to a temporary directory, so nothing
+# is marked as transcribed
+
+NUM_RECORDINGS = 8
+WORKERS = [1, 2, 4, 8]
+THREADS = [1, 2, 4, 8, 16]
+
+
+def configurations(cores):
+	return [
+		(workers, threads)
+		for workers in WORKERS
+		for threads in THREADS
+		if workers * threads <= cores and workers <= NUM_RECORDINGS
+	]
+
+
+def main():
+	result = extract_text.TranscriptionResult()
+	empty = tempfile.mkdtemp(prefix="bench_transcription_")
+	try:
+		# the same seeded shuffle as the job, so the same sample every time
+		recordings = extract_text.get_pending(result, empty)[:NUM_RECORDINGS]
+	finally:
+		shutil.rmtree(empty)
+	audio_hours = (
+		sum(r.audio_length.total_seconds() for r in recordings if r.audio_length) / 3600
+	)
+	print(f"{len(recordings)} recordings, {audio_hours:.2f} audio hours")
+
+	rows = []
+	for workers, threads in configurations(os.cpu_count() or 1):
+		output_directory = tempfile.mkdtemp(prefix="bench_transcription_")
+		try:
+			reports, wall_seconds = extract_text.run_sharded(
+				result, recordings, workers, threads, output_directory
+			)
+		finally:
+			shutil.rmtree(output_directory)
+		audio_seconds = sum(report.audio_seconds for report in reports)
+		errors = sum(report.num_errored for report in reports)
+		rows.append((workers, threads, wall_seconds, audio_seconds, errors))
+
+	print(f"{'workers':>8} {'threads':>8} {'wall':>9} {'rtf':>7} {'audio h/h':>10}")
+	for workers, threads, wall_seconds, audio_seconds, errors in rows:
+		rtf = wall_seconds / audio_seconds if audio_seconds else float("nan")
+		rate = audio_seconds / wall_seconds
+		note = f"  {errors} errors" if errors else ""
+		print(
+			f"{workers:>8} {threads:>8} {wall_seconds:>8.1f}s {rtf:>7.3f} {rate:>10.1f}{note}"
+		)
+
+
+if __name__ == "__main__":
+	main()
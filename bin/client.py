@@ -10,14 +10,14 @@ def play_a_recording():
 	recs = client.list_recordings()
 	for rec in recs:
 		print(
-			f"{rec['id']} | {rec['file_path']} | {rec['begin_date']} | {rec['audio_length']}"
+			f"{rec['uuid']} | {rec['file_path']} | {rec['begin_date']} | {rec['audio_length']}"
 		)
 
 	if not recs:
 		print("No recordings found.")
 		return
 
-	first_id = recs[0]["id"]
+	first_id = recs[0]["uuid"]
 	print("\n=== Details for first recording ===")
 	detail = client.get_recording(first_id)
 	for k, v in detail.items():
@@ -34,7 +34,7 @@ def play_a_recording():
 
 	# offset = input("Enter start offset in seconds (default 0): ") or 0
 	offset = 2
-	client.play_recording(sel["id"], int(offset))
+	client.play_recording(sel["uuid"], int(offset))
 
 
 def search_recordings():
@@ -0,0 +1,120 @@
+import concurrent.futures
+import difflib
+import json
+import multiprocessing
+import os
+import resource
+import shutil
+import sys
+import tempfile
+
+from jobs import extract_text
+
+# PYTHONPATH=src python bin/compare_quantization.py [file_path ...]
+# the fp32 model against the reduced precision ones on the same local
+# recordings: real time factor without the model load, the model load
+# itself, peak RSS, and how many of the fp32 transcript's words the other
+# transcripts agree with. without arguments it takes the job's own seeded
+# sample of pending recordings
+
+NUM_RECORDINGS = 4
+MODES = [None, "int8", "bfloat16"]
+THREADS = os.cpu_count() or 1
+
+
+def words(transcription: dict) -> list:
+	return " ".join(entry["text"] or "" for entry in transcription["entries"]).split()
+
+
+def word_agreement(baseline: list, other: list) -> float:
+	"""Share of the baseline's words the other one has, in the same order."""
+	if not baseline:
+		return 1.0 if not other else 0.0
+	matcher = difflib.SequenceMatcher(a=baseline, b=other, autojunk=False)
+	matched = sum(block.size for block in matcher.get_matching_blocks())
+	return matched / len(baseline)
+
+
+def inference_rtf(report) -> float:
+	# loading and quantizing the model is paid once, it is shown on its own
+	if not report.audio_seconds:
+		return float("nan")
+	return (report.wall_seconds - report.startup_seconds) / report.audio_seconds
+
+
+def transcribe(result, recordings):
+	# a process per mode, so peak RSS is that model's and nothing else's
+	output_directory = tempfile.mkdtemp(prefix="compare_quantization_")
+	try:
+		report = extract_text.run_shard(
+			result, recordings, 0, THREADS, output_directory
+		)
+		texts = {}
+		for recording in recordings:
+			path = extract_text.transcription_path(output_directory, recording.uuid)
+			if os.path.exists(path):
+				with open(path) as f:
+					texts[recording.uuid] = words(json.load(f))
+	finally:
+		shutil.rmtree(output_directory)
+	# kilobytes on linux
+	peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+	return report, texts, peak_rss
+
+
+def get_recordings(result, file_paths):
+	empty = tempfile.mkdtemp(prefix="compare_quantization_")
+	try:
+		recordings = extract_text.get_pending(result, empty)
+	finally:
+		shutil.rmtree(empty)
+	if file_paths:
+		return [r for r in recordings if r.file_path in file_paths]
+	return recordings[:NUM_RECORDINGS]
+
+
+def main():
+	base = extract_text.TranscriptionResult()
+	recordings = get_recordings(base, set(sys.argv[1:]))
+	audio_hours = (
+		sum(r.audio_length.total_seconds() for r in recordings if r.audio_length) / 3600
+	)
+	print(f"{len(recordings)} recordings, {audio_hours:.2f} audio hours")
+
+	rows = []
+	baseline = None
+	context = multiprocessing.get_context("spawn")
+	for mode in MODES:
+		result = base.model_copy(update={"quantization": mode})
+		with concurrent.futures.ProcessPoolExecutor(1, mp_context=context) as pool:
+			try:
+				report, texts, peak_rss = pool.submit(
+					transcribe, result, recordings
+				).result()
+			except Exception as e:
+				print(f"{mode or 'fp32'} failed: {e}")
+				continue
+		if baseline is None and mode is None:
+			baseline = texts
+		agreement = None
+		if baseline is not None:
+			scores = [
+				word_agreement(baseline[uuid], texts.get(uuid, [])) for uuid in baseline
+			]
+			agreement = sum(scores) / len(scores) if scores else None
+		rows.append((mode or "fp32", report, peak_rss, agreement))
+
+	print(
+		f"{'mode':>9} {'rtf':>7} {'startup':>8} {'peak rss':>10} {'agreement':>10}"
+		f" {'errors':>7}"
+	)
+	for mode, report, peak_rss, agreement in rows:
+		agreement = f"{agreement:.1%}" if agreement is not None else "-"
+		print(
+			f"{mode:>9} {inference_rtf(report):>7.3f} {report.startup_seconds:>7.1f}s"
+			f" {peak_rss / 2**20:>8.0f}MB {agreement:>10} {report.num_errored:>7}"
+		)
+
+
+if __name__ == "__main__":
+	main()
@@ -1,33 +1,16 @@
-import ffmpeg
 import numpy as np
 import matplotlib.pyplot as plt
 import sys
-import tqdm
 
-def load_audio_ffmpeg(path, sr=16000):
-	"""Load audio using ffmpeg and return mono float32 numpy array."""
-	out, _ = (
-		ffmpeg
-		.input(path)
-		.output('pipe:', format='f32le', acodec='pcm_f32le', ac=1, ar=sr)
-		.run(capture_stdout=True, capture_stderr=True)
-	)
-	audio = np.frombuffer(out, np.float32)
-	return audio, sr
+from jobs import audio_features
 
-def analyze_changes(data, samplerate, window_sec=1.0):
-	samples_per_window = int(window_sec * samplerate)
-	rms_values = []
+# PYTHONPATH=src python bin/get_differences.py path_to_file.opus
 
-	for start in tqdm.tqdm(range(0, len(data), samples_per_window)):
-		chunk = data[start:start + samples_per_window]
-		if len(chunk) == 0:
-			continue
-		rms = np.sqrt(np.mean(chunk**2))
-		rms_values.append(rms)
-
-	changes = np.abs(np.diff(rms_values))
-	return changes, np.arange(1, len(rms_values)) * window_sec
+def analyze_changes(path, window_sec=1.0):
+	# streamed from ffmpeg a block at a time instead of loading the whole file
+	features = audio_features.compute_features(path, window_sec)
+	changes = audio_features.change_scores(features)
+	return changes, np.arange(1, len(features)) * window_sec
 
 def plot_changes(changes, times, threshold=None):
 	plt.figure(figsize=(12, 6))
@@ -48,6 +31,5 @@ if __name__ == "__main__":
 		sys.exit(1)
 
 	path = sys.argv[1]
-	audio, sr = load_audio_ffmpeg(path)
-	changes, times = analyze_changes(audio, sr)
+	changes, times = analyze_changes(path)
 	plot_changes(changes, times)
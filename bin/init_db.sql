@@ -13,12 +13,106 @@ CREATE TABLE IF NOT EXISTS recording (
 	sha256sum char(64),
 	disk_usage INT,
 	-- could have a checksummed_at
-	imported_at TIMESTAMPTZ DEFAULT now()
+	imported_at TIMESTAMPTZ DEFAULT now(),
+	-- ogg.OggIndex.to_bytes(), where each page starts
+	ogg_index BYTEA,
+	-- vad.to_bytes(), where there is voice, see jobs/vad_index.py
+	active_regions BYTEA,
+	-- last change to what the api serves, so it can refresh just these rows
+	updated_at TIMESTAMPTZ
 );
 
+ALTER TABLE recording ADD COLUMN IF NOT EXISTS ogg_index BYTEA;
+ALTER TABLE recording ADD COLUMN IF NOT EXISTS active_regions BYTEA;
+ALTER TABLE recording ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ;
+
 -- select sha256sum from recording where sha256sum is not null;
 
 CREATE UNIQUE INDEX IF NOT EXISTS unique_file_path ON recording (file_path);
+-- keyset pagination of /recordings
+CREATE INDEX IF NOT EXISTS recording_begin_date_uuid ON recording (begin_date, uuid);
+
+-- bumped whenever what the api serves about recordings changes, the
+-- api listens on the catalog_version channel and uses it as an etag
+CREATE TABLE IF NOT EXISTS catalog_version (
+	id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+	version BIGINT NOT NULL,
+	-- version of the last delete, inserts and updates can be picked up by
+	-- imported_at and updated_at but a deleted row leaves nothing behind
+	deleted_version BIGINT NOT NULL DEFAULT 0
+);
+
+ALTER TABLE catalog_version ADD COLUMN IF NOT EXISTS deleted_version BIGINT NOT NULL DEFAULT 0;
+
+INSERT INTO catalog_version (id, version) VALUES (TRUE, 0) ON CONFLICT DO NOTHING;
+
+CREATE OR REPLACE FUNCTION bump_catalog_version() RETURNS trigger AS $$
+DECLARE
+	new_version BIGINT;
+BEGIN
+	UPDATE catalog_version SET
+		version = version + 1,
+		deleted_version = CASE
+			WHEN TG_OP IN ('DELETE', 'TRUNCATE') THEN version + 1
+			ELSE deleted_version
+		END
+	RETURNING version INTO new_version;
+	-- delivered on commit
+	PERFORM pg_notify('catalog_version', new_version::text);
+	RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- per row so an INSERT ... ON CONFLICT DO NOTHING that did nothing doesn't
+-- count, and ogg_index and active_regions are not something the api hands out
+CREATE OR REPLACE TRIGGER recording_catalog_version
+AFTER INSERT OR DELETE OR UPDATE OF file_path, begin_date, audio_length, source, sha256sum, disk_usage
+ON recording
+FOR EACH ROW EXECUTE FUNCTION bump_catalog_version();
+
+CREATE OR REPLACE TRIGGER recording_truncate_catalog_version
+AFTER TRUNCATE ON recording
+FOR EACH STATEMENT EXECUTE FUNCTION bump_catalog_version();
+
+CREATE OR REPLACE FUNCTION touch_recording() RETURNS trigger AS $$
+BEGIN
+	NEW.updated_at = now();
+	RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+-- the same columns as the catalog version, a checksum filled in later is
+-- picked up without reloading everything
+CREATE OR REPLACE TRIGGER recording_updated_at
+BEFORE UPDATE OF file_path, begin_date, audio_length, source, sha256sum, disk_usage
+ON recording
+FOR EACH ROW EXECUTE FUNCTION touch_recording();
+
+-- per source and hour/day bucket of begin_date, kept up to date by
+-- jobs/fs_synchronize.py, python -m jobs.rollups rebuilds it from scratch
+CREATE TABLE IF NOT EXISTS recording_rollup (
+	bucket TEXT NOT NULL,
+	bucket_start TIMESTAMPTZ NOT NULL,
+	-- '' for recordings without a source
+	source TEXT NOT NULL,
+	num_recordings INT NOT NULL,
+	sum_audio_length INTERVAL NOT NULL,
+	sum_disk_usage BIGINT NOT NULL,
+	PRIMARY KEY (bucket, source, bucket_start)
+);
+
+CREATE INDEX IF NOT EXISTS recording_rollup_bucket_start ON recording_rollup (bucket, bucket_start);
+
+-- search_store.PostgresSearchStore, data is the whole schemas.searches.Search
+CREATE TABLE IF NOT EXISTS search (
+	uuid UUID PRIMARY KEY,
+	search_status TEXT NOT NULL,
+	created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+	updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+	data JSONB NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS search_status_updated_at ON search (search_status, updated_at);
 
 
 -- CREATE TABLE IF NOT EXISTS transcription_job (
@@ -1,43 +1,95 @@
 import datetime
+import json
+import os
 import subprocess
-from typing import Optional
+from typing import Callable, List, Optional
 
 import requests
+from websockets.sync.client import connect
 
 import schemas.recordings as schema
 import schemas.searches as searches
 
 BASE_URL = "http://localhost:8000"
 
+# one keep-alive connection for every call instead of a new one each time
+session = requests.Session()
+# the bodies are model_dump_json() strings, newer fastapi won't parse them
+# without this
+session.headers["Content-Type"] = "application/json"
 
-def list_recordings(start=None, end=None):
-	params = {}
+
+def iter_recordings(start=None, end=None, page_size=500):
+	params = {"limit": page_size}
 	if start:
 		params["start"] = start
 	if end:
 		params["end"] = end
-	resp = requests.get(f"{BASE_URL}/recordings", params=params)
-	resp.raise_for_status()
-	return resp.json()
+	while True:
+		resp = session.get(f"{BASE_URL}/recordings", params=params)
+		resp.raise_for_status()
+		page = resp.json()
+		yield from page["recordings"]
+		if not page.get("next_cursor"):
+			return
+		params["after"] = page["next_cursor"]
+
+
+def stream_recordings(start=None, end=None):
+	params = {"format": "ndjson"}
+	if start:
+		params["start"] = start
+	if end:
+		params["end"] = end
+	with session.get(f"{BASE_URL}/recordings", params=params, stream=True) as resp:
+		resp.raise_for_status()
+		for line in resp.iter_lines():
+			if line:
+				yield json.loads(line)
+
+
+def list_recordings(start=None, end=None):
+	return list(iter_recordings(start, end))
 
 
 def get_recording(rec_id):
-	resp = requests.get(f"{BASE_URL}/recordings/{rec_id}")
+	resp = session.get(f"{BASE_URL}/recordings/{rec_id}")
 	resp.raise_for_status()
 	return resp.json()
 
 
+def download_recording(rec_id, destination: str, etag: Optional[str] = None):
+	# picks up where a previous partial download of the same file left off
+	headers = {}
+	if etag and os.path.exists(destination):
+		headers["Range"] = f"bytes={os.path.getsize(destination)}-"
+		headers["If-Range"] = etag
+	resp = session.get(
+		f"{BASE_URL}/recordings/{rec_id}/raw", headers=headers, stream=True
+	)
+	resp.raise_for_status()
+	mode = "ab" if resp.status_code == 206 else "wb"
+	with open(destination, mode) as f:
+		for chunk in resp.iter_content(chunk_size=1024 * 1024):
+			f.write(chunk)
+	return resp.headers.get("etag")
+
+
 def play_recording(
 	play_request: searches.PlayRecordingRequest,
 ):
-	play_request.duration = datetime.timedelta(seconds=5)
-	resp = requests.post(
+	if play_request.duration is None:
+		play_request.duration = datetime.timedelta(seconds=5)
+	resp = session.post(
 		f"{BASE_URL}/play/{play_request.recording_id}",
 		data=play_request.model_dump_json(),
 		stream=True,
 	)
 	resp.raise_for_status()
+	_play_stream(resp)
+
 
+def _play_stream(resp: requests.Response):
 	# Launch ffplay with stdin from HTTP stream
 	# -autoexit: exit when stream ends, -nodisp: no video window
 	player = subprocess.Popen(
@@ -56,31 +108,92 @@ def play_recording(
 		player.wait()
 
 
+def play_range(start: datetime.datetime, end: datetime.datetime):
+	payload = searches.PlayRangeRequest(start=start, end=end)
+	resp = session.post(f"{BASE_URL}/play", data=payload.model_dump_json(), stream=True)
+	resp.raise_for_status()
+	_play_stream(resp)
+
+
 # just pass the request...
 def create_search(
 	duration: Optional[datetime.timedelta] = None,
 	lower: Optional[datetime.datetime] = None,
 	upper: Optional[datetime.datetime] = None,
+	prompts_per_round: int = 1,
 ) -> searches.Search:
-	payload = searches.CreateSearchRequest(duration=duration, lower=lower, upper=upper)
-	resp = requests.post(f"{BASE_URL}/search", data=payload.model_dump_json())
+	payload = searches.CreateSearchRequest(
+		duration=duration,
+		lower=lower,
+		upper=upper,
+		prompts_per_round=prompts_per_round,
+	)
+	resp = session.post(f"{BASE_URL}/search", data=payload.model_dump_json())
 	resp.raise_for_status()
 	return searches.Search.model_validate(resp.json())
 
 
 def get_prompt(search: searches.Search) -> searches.SearchPrompt:
-	resp = requests.get(f"{BASE_URL}/search/{search.uuid}/prompt")
+	resp = session.get(f"{BASE_URL}/search/{search.uuid}/prompt")
 	resp.raise_for_status()
 	return searches.SearchPrompt.model_validate(resp.json())
 
 
+def get_prompts(
+	search: searches.Search, k: Optional[int] = None
+) -> searches.MultiSearchPrompt:
+	params = {"k": k} if k else {}
+	resp = session.get(f"{BASE_URL}/search/{search.uuid}/prompts", params=params)
+	resp.raise_for_status()
+	return searches.MultiSearchPrompt.model_validate(resp.json())
+
+
+def vote_search(search_id: str, vote: searches.MultiSearchUpdate) -> searches.Search:
+	resp = session.put(
+		f"{BASE_URL}/search/{search_id}/vote", data=vote.model_dump_json()
+	)
+	resp.raise_for_status()
+	return searches.Search.model_validate(resp.json())
+
+
 def update_search(search_id: str, update: searches.SearchUpdate) -> searches.Search:
-	resp = requests.put(f"{BASE_URL}/search/{search_id}", data=update.model_dump_json())
+	resp = session.put(f"{BASE_URL}/search/{search_id}", data=update.model_dump_json())
 	resp.raise_for_status()
 	return searches.Search.model_validate(resp.json())
 
 
 def get_statistics() -> schema.RecordingsSummary:
-	resp = requests.get(f"{BASE_URL}/statistics")
+	resp = session.get(f"{BASE_URL}/statistics")
 	resp.raise_for_status()
 	return schema.RecordingsSummary.model_validate(resp.json())
+
+
+def run_search_session(
+	search: searches.Search,
+	answer: Callable[
+		[searches.MultiSearchPrompt, List[bytes]], searches.MultiSearchUpdate
+	],
+	k: Optional[int] = None,
+) -> searches.Search:
+	"""
+	Runs a search over one websocket. answer gets each round of prompts
+	with the mp3 of every prompt and returns the vote, the finished search
+	is returned once a vote completes it.
+	"""
+	url = BASE_URL.replace("http", "ws", 1) + f"/search/{search.uuid}/session"
+	if k:
+		url += f"?k={k}"
+	with connect(url) as ws:
+		while True:
+			message = searches.SearchSessionMessage.model_validate_json(ws.recv())
+			if message.search:
+				return message.search
+			if message.error:
+				raise ValueError(message.error)
+			audio = []
+			for _ in message.prompts.prompts:
+				chunks = []
+				while chunk := ws.recv():
+					chunks.append(chunk)
+				audio.append(b"".join(chunks))
+			ws.send(answer(message.prompts, audio).model_dump_json())
@@ -1,4 +1,7 @@
+import base64
+import binascii
 import datetime
+from typing import Tuple
 
 
 def normalize_datetime(dt: datetime.datetime) -> datetime.datetime:
@@ -7,3 +10,20 @@ def normalize_datetime(dt: datetime.datetime) -> datetime.datetime:
 	else:
 		dt = dt.astimezone(datetime.timezone.utc)
 	return dt
+
+
+def encode_cursor(begin_date: datetime.datetime, uuid: str) -> str:
+	raw = f"{normalize_datetime(begin_date).isoformat()}|{uuid}"
+	return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime.datetime, str]:
+	# raises ValueError on anything that was not made by encode_cursor
+	try:
+		raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+	except (binascii.Error, UnicodeDecodeError) as e:
+		raise ValueError(f"Invalid cursor: {cursor}") from e
+	begin_date, sep, uuid = raw.partition("|")
+	if not sep or not uuid:
+		raise ValueError(f"Invalid cursor: {cursor}")
+	return normalize_datetime(datetime.datetime.fromisoformat(begin_date)), uuid
@@ -0,0 +1,45 @@
+import datetime
+import uuid
+from typing import Any, Iterable, List, Mapping, Sequence
+
+import orjson
+from fastapi.responses import Response
+
+# same output as the pydantic models, datetimes end in Z. numpy arrays
+# have to be C contiguous, NaN comes out as null
+OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_SERIALIZE_NUMPY
+
+
+def _default(obj: Any) -> Any:
+	# the pydantic models serialize timedeltas as seconds too
+	if isinstance(obj, datetime.timedelta):
+		return obj.total_seconds()
+	# asyncpg's own uuid type, orjson only knows uuid.UUID exactly
+	if isinstance(obj, uuid.UUID):
+		return str(obj)
+	raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(obj: Any) -> bytes:
+	return orjson.dumps(obj, default=_default, option=OPTIONS)
+
+
+def rows(records: Iterable[Mapping]) -> List[dict]:
+	# asyncpg records turn into dicts in C, orjson takes it from there
+	return [dict(r) for r in records]
+
+
+def columns(records: Sequence[Sequence], names: Sequence[str]) -> dict:
+	# one array per column, a lot less repetition than a list of objects
+	return {name: [r[i] for r in records] for i, name in enumerate(names)}
+
+
+class JSONResponse(Response):
+	"""Content that is already JSON, or anything dumps() can handle."""
+
+	media_type = "application/json"
+
+	def render(self, content: Any) -> bytes:
+		if isinstance(content, bytes):
+			return content
+		return dumps(content)
@@ -0,0 +1,253 @@
+import collections
+import contextlib
+import string
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Deque, Generic, Iterator, List, Optional, Tuple, TypeVar
+
+import numpy as np
+
+import vad
+
+T = TypeVar("T")
+
+
+def split_chunks(
+	samples: np.ndarray,
+	regions: Optional[np.ndarray],
+	sample_rate: int,
+	chunk_seconds: float,
+	overlap_seconds: float = 0.0,
+) -> List[Tuple[np.ndarray, np.ndarray]]:
+	"""
+	The audio cut into chunks of at most chunk_seconds, each with
+	vad.gather() offsets back to the recording. Active regions are packed
+	whole where they fit so the cuts land in silence, longer ones are cut
+	into equal parts overlapping by overlap_seconds, for stitch() to join
+	again. No regions means the whole file.
+	"""
+	limit = round(chunk_seconds * 1000)
+	overlap = round(overlap_seconds * 1000)
+	if overlap >= limit:
+		raise ValueError("Chunks have to be longer than their overlap")
+	if regions is None:
+		regions = [(0, len(samples) * 1000 // sample_rate)]
+	pieces = []
+	for start, end in regions:
+		start, end = int(start), int(end)
+		if end - start <= limit:
+			pieces.append((start, end))
+			continue
+		# equal parts rather than a short last one, two of them are always
+		# longer than a chunk so they never end up in the same one
+		count = -(-(end - start - overlap) // (limit - overlap))
+		length = (end - start + (count - 1) * overlap) / count
+		starts = np.linspace(start, end - length, count).round().astype(int)
+		ends = np.linspace(start + length, end, count).round().astype(int)
+		pieces.extend(zip(starts.tolist(), ends.tolist()))
+
+	chunks, current, length = [], [], 0
+	for begin, end in pieces:
+		if current and length + end - begin > limit:
+			chunks.append(current)
+			current, length = [], 0
+		current.append((begin, end))
+		length += end - begin
+	if current:
+		chunks.append(current)
+
+	ret = []
+	for chunk in chunks:
+		audio, offsets = vad.gather(
+			samples, np.array(chunk, dtype=np.uint32), sample_rate
+		)
+		if len(audio):
+			ret.append((audio, offsets))
+	return ret
+
+
+class BatchScheduler(Generic[T]):
+	"""
+	Items from any number of recordings, handed out batch_size at a time,
+	or fewer once the oldest one has waited max_wait seconds.
+	"""
+
+	def __init__(
+		self,
+		batch_size: int,
+		max_wait: float,
+		clock: Callable[[], float] = time.monotonic,
+	):
+		self.batch_size = max(batch_size, 1)
+		self.max_wait = max_wait
+		self.clock = clock
+		self.waiting: Deque[Tuple[float, T]] = collections.deque()
+
+	def __len__(self) -> int:
+		return len(self.waiting)
+
+	def add(self, item: T) -> None:
+		self.waiting.append((self.clock(), item))
+
+	def timeout(self) -> Optional[float]:
+		"""Seconds until the oldest item is due, None when there is none."""
+		if not self.waiting:
+			return None
+		return max(self.waiting[0][0] + self.max_wait - self.clock(), 0.0)
+
+	def next_batch(self, flush: bool = False) -> List[T]:
+		"""A full batch, a due one, or anything left when flushing."""
+		if not self.waiting:
+			return []
+		if len(self.waiting) < self.batch_size and not flush and self.timeout() > 0:
+			return []
+		count = min(self.batch_size, len(self.waiting))
+		return [self.waiting.popleft()[1] for _ in range(count)]
+
+
+def shard(items: List[T], count: int, weight: Callable[[T], float]) -> List[List[T]]:
+	"""
+	items split into count shards of about the same total weight, heaviest
+	first onto the lightest shard. The same items always give the same
+	shards, each one in the order the items came in.
+	"""
+	count = max(count, 1)
+	totals = [0.0] * count
+	assigned = [[] for _ in range(count)]
+	order = sorted(range(len(items)), key=lambda i: (-weight(items[i]), i))
+	for i in order:
+		lightest = totals.index(min(totals))
+		totals[lightest] += weight(items[i])
+		assigned[lightest].append(i)
+	return [[items[i] for i in sorted(indexes)] for indexes in assigned]
+
+
+def chunk_span(
+	audio: np.ndarray, offsets: np.ndarray, sample_rate: int
+) -> Tuple[float, float]:
+	"""Where a split_chunks() chunk starts and ends in the recording, in seconds."""
+	end = offsets[-1, 1] + len(audio) / sample_rate - offsets[-1, 0]
+	return float(offsets[0, 1]), float(end)
+
+
+# (start, end, text) in seconds of the recording, whisper leaves out the
+# end of a last chunk that runs off the audio
+Entry = Tuple[Optional[float], Optional[float], str]
+
+# fewer words repeated across a cut are taken to be actually said twice
+MIN_REPEATED_WORDS = 2
+MAX_REPEATED_WORDS = 30
+
+
+def overlapping_segments(
+	duration: float, segment_seconds: float, overlap_seconds: float
+) -> List[Tuple[float, float]]:
+	"""
+	[start, end) segments of at most segment_seconds covering duration
+	seconds, each overlapping the next by overlap_seconds.
+	"""
+	step = segment_seconds - overlap_seconds
+	if step <= 0:
+		raise ValueError("Segments have to be longer than their overlap")
+	segments = []
+	start = 0.0
+	while start < duration:
+		end = min(start + segment_seconds, duration)
+		segments.append((start, end))
+		if end >= duration:
+			break
+		start += step
+	return segments
+
+
+def _normalize(word: str) -> str:
+	return word.lower().strip(string.punctuation)
+
+
+def _drop_repeated(previous: List[Entry], entry: Entry) -> Entry:
+	"""entry without the words it starts with that previous ended with."""
+	tail = " ".join(text for _, _, text in previous[-3:]).split()
+	tail = [_normalize(word) for word in tail[-MAX_REPEATED_WORDS:]]
+	words = entry[2].split()
+	normalized = [_normalize(word) for word in words]
+	for count in range(min(len(tail), len(words)), MIN_REPEATED_WORDS - 1, -1):
+		if tail[-count:] == normalized[:count]:
+			rest = words[count:]
+			return entry[0], entry[1], " " + " ".join(rest) if rest else ""
+	return entry
+
+
+def stitch(segments: List[Tuple[float, float, List[Entry]]]) -> List[Entry]:
+	"""
+	The entries of overlapping segments, already in recording time, as
+	one transcript. Where two segments overlap, entries starting before
+	the middle of the overlap come from the first one and the rest from
+	the second, and words the second repeats from the end of the first
+	are dropped. Segments that don't overlap are joined as they are.
+	"""
+	ret: List[Entry] = []
+	for i, (start, end, entries) in enumerate(segments):
+		lower = (segments[i - 1][1] + start) / 2 if i else float("-inf")
+		upper = (
+			(end + segments[i + 1][0]) / 2 if i + 1 < len(segments) else float("inf")
+		)
+		kept = [
+			entry
+			for entry in entries
+			if lower <= (entry[0] if entry[0] is not None else start) < upper
+		]
+		if ret and kept and i and start < segments[i - 1][1]:
+			kept[0] = _drop_repeated(ret, kept[0])
+			if not kept[0][2]:
+				kept.pop(0)
+		ret.extend(kept)
+	return ret
+
+
+@dataclass
+class Throughput:
+	"""Audio transcribed against wall time, since it was created."""
+
+	audio_seconds: float = 0.0
+	began: float = field(default_factory=time.monotonic)
+
+	def audio_hours_per_hour(self) -> float:
+		wall = time.monotonic() - self.began
+		return self.audio_seconds / wall if wall > 0 else 0.0
+
+
+class StageStats:
+	"""
+	How much of the time since it was created a pipeline stage spent
+	working, shared by the threads of that stage. Time blocked on a queue
+	doesn't count, so a stage well below 100% is waiting on its neighbours.
+	"""
+
+	def __init__(
+		self, name: str, workers: int = 1, clock: Callable[[], float] = time.monotonic
+	):
+		self.name = name
+		self.workers = workers
+		self.clock = clock
+		self.began = clock()
+		self.busy_seconds = 0.0
+		self.num_items = 0
+		self.lock = threading.Lock()
+
+	@contextlib.contextmanager
+	def busy(self) -> Iterator[None]:
+		began = self.clock()
+		try:
+			yield
+		finally:
+			with self.lock:
+				self.busy_seconds += self.clock() - began
+				self.num_items += 1
+
+	def utilization(self) -> float:
+		wall = (self.clock() - self.began) * self.workers
+		return self.busy_seconds / wall if wall > 0 else 0.0
+
+	def __str__(self) -> str:
+		return f"{self.name}: {self.num_items} items, {self.utilization():.0%} busy"
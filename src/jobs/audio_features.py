@@ -0,0 +1,279 @@
+import collections
+import concurrent.futures
+import os
+import subprocess
+from dataclasses import dataclass, field
+from typing import Callable, Iterable, Iterator, Optional, Tuple, TypeVar
+
+import numpy as np
+import tqdm
+
+from jobs.utils import connect_to_db
+
+# what everything is decoded to
+SAMPLE_RATE = 16000
+# seconds of audio decoded per read, 10 minutes is about 38MB of float32
+BLOCK_SECONDS = 600
+OUTPUT_DIRECTORY = "./outputs/features"
+
+# columns of the feature arrays
+RMS, PEAK, ZCR = 0, 1, 2
+NUM_FEATURES = 3
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+def decode_command(
+	path: str,
+	sample_rate: int = SAMPLE_RATE,
+	offset: Optional[float] = None,
+	duration: Optional[float] = None,
+):
+	cmd = ["ffmpeg", "-nostdin", "-loglevel", "error"]
+	if offset:
+		# before -i, seeks in the file rather than decoding up to it
+		cmd += ["-ss", str(offset)]
+	cmd += ["-i", path]
+	if duration is not None:
+		cmd += ["-t", str(duration)]
+	return cmd + [
+		"-f",
+		"f32le",
+		"-ac",
+		"1",
+		"-ar",
+		str(sample_rate),
+		"-",
+	]
+
+
+def decode(
+	path: str,
+	sample_rate: int = SAMPLE_RATE,
+	expected_seconds: Optional[float] = None,
+	offset: Optional[float] = None,
+	duration: Optional[float] = None,
+) -> np.ndarray:
+	"""
+	The file, or duration seconds of it from offset, as float32 samples
+	read from an ffmpeg pipe straight into one buffer, nothing goes
+	through the disk. expected_seconds sizes the buffer up front, it grows
+	when that was too little.
+	"""
+	# a second spare, lengths in the database are rounded
+	capacity = round((expected_seconds or BLOCK_SECONDS) * sample_rate) + sample_rate
+	buffer = np.empty(capacity, dtype=np.float32)
+	filled = 0
+	proc = subprocess.Popen(
+		decode_command(path, sample_rate, offset, duration), stdout=subprocess.PIPE
+	)
+	try:
+		while True:
+			if filled == buffer.nbytes:
+				grown = np.empty(2 * len(buffer), dtype=np.float32)
+				grown[: len(buffer)] = buffer
+				buffer = grown
+			view = memoryview(buffer).cast("B")
+			count = proc.stdout.readinto(view[filled:])
+			view.release()
+			if not count:
+				break
+			filled += count
+	finally:
+		proc.stdout.close()
+		returncode = proc.wait()
+	if returncode != 0:
+		raise RuntimeError(f"ffmpeg exited with {returncode} for {path}")
+	return buffer[: filled // 4]
+
+
+class DecodeCache:
+	"""
+	Decoded recordings kept in memory for when they get processed again,
+	least recently used evicted first once they take more than max_bytes.
+	A max_bytes of 0 keeps nothing.
+	"""
+
+	def __init__(self, max_bytes: int):
+		self.max_bytes = max_bytes
+		self.size = 0
+		self.entries: collections.OrderedDict[str, np.ndarray] = (
+			collections.OrderedDict()
+		)
+
+	def get(self, key: str) -> Optional[np.ndarray]:
+		samples = self.entries.get(key)
+		if samples is not None:
+			self.entries.move_to_end(key)
+		return samples
+
+	def put(self, key: str, samples: np.ndarray) -> None:
+		if samples.nbytes > self.max_bytes or key in self.entries:
+			return
+		self.entries[key] = samples
+		self.size += samples.nbytes
+		while self.size > self.max_bytes:
+			_, evicted = self.entries.popitem(last=False)
+			self.size -= evicted.nbytes
+
+
+def iter_frames(
+	path: str,
+	window: int,
+	sample_rate: int = SAMPLE_RATE,
+	block_seconds: int = BLOCK_SECONDS,
+) -> Iterator[np.ndarray]:
+	"""
+	The decoded audio as (k, window) float32 blocks of windows, read from
+	an ffmpeg pipe so only one block is ever in memory. A last partial
+	window comes as a block of its own, (1, r).
+	"""
+	# whole windows per read, so blocks never split one
+	block_bytes = max(block_seconds * sample_rate // window, 1) * window * 4
+	proc = subprocess.Popen(decode_command(path, sample_rate), stdout=subprocess.PIPE)
+	rest = b""
+	try:
+		while True:
+			data = proc.stdout.read(block_bytes)
+			if not data:
+				break
+			data = rest + data
+			num_windows = len(data) // (window * 4)
+			rest = data[num_windows * window * 4 :]
+			if num_windows:
+				yield np.frombuffer(
+					data, dtype=np.float32, count=num_windows * window
+				).reshape(num_windows, window)
+	finally:
+		proc.stdout.close()
+		returncode = proc.wait()
+	if returncode != 0:
+		raise RuntimeError(f"ffmpeg exited with {returncode} for {path}")
+	if len(rest) >= 4:
+		yield np.frombuffer(rest, dtype=np.float32, count=len(rest) // 4).reshape(1, -1)
+
+
+def frame_features(frames: np.ndarray) -> np.ndarray:
+	"""RMS, peak and zero crossing rate of every row of frames."""
+	ret = np.empty((len(frames), NUM_FEATURES), dtype=np.float32)
+	ret[:, RMS] = np.sqrt(np.mean(np.square(frames), axis=1))
+	ret[:, PEAK] = np.max(np.abs(frames), axis=1)
+	signs = np.signbit(frames)
+	crossings = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1)
+	ret[:, ZCR] = crossings / max(frames.shape[1] - 1, 1)
+	return ret
+
+
+def iter_features(
+	path: str, window_seconds: float, sample_rate: int = SAMPLE_RATE
+) -> Iterator[np.ndarray]:
+	window = round(window_seconds * sample_rate)
+	for frames in iter_frames(path, window, sample_rate):
+		yield frame_features(frames)
+
+
+def compute_features(
+	path: str, window_seconds: float, sample_rate: int = SAMPLE_RATE
+) -> np.ndarray:
+	"""(n, NUM_FEATURES) for every window of the file, in constant memory."""
+	blocks = list(iter_features(path, window_seconds, sample_rate))
+	if not blocks:
+		return np.empty((0, NUM_FEATURES), dtype=np.float32)
+	return np.concatenate(blocks)
+
+
+def change_scores(features: np.ndarray) -> np.ndarray:
+	"""How much the loudness changed from one window to the next, n - 1 of them."""
+	return np.abs(np.diff(features[:, RMS]))
+
+
+def process_map(
+	fn: Callable[[T], R],
+	items: Iterable[T],
+	processes: Optional[int] = None,
+) -> Iterator[Tuple[T, Optional[R], Optional[Exception]]]:
+	"""
+	fn over items in a pool of processes, as (item, result, error) in
+	whatever order they finish. Decoding is one ffmpeg per file and the
+	numpy reductions hold the GIL, so processes rather than threads.
+	"""
+	items = list(items)
+	with concurrent.futures.ProcessPoolExecutor(processes) as pool:
+		futures = {pool.submit(fn, item): item for item in items}
+		for future in tqdm.tqdm(
+			concurrent.futures.as_completed(futures), total=len(futures)
+		):
+			try:
+				yield futures[future], future.result(), None
+			except Exception as e:
+				yield futures[future], None, e
+
+
+@dataclass
+class FeaturesResult:
+	root_directory: str
+	num_computed: int = field(default=0)
+	num_skipped: int = field(default=0)
+	num_errored: int = field(default=0)
+
+
+def feature_path(output_directory: str, uuid: str) -> str:
+	return os.path.join(output_directory, f"{uuid}.npy")
+
+
+def get_files_to_process(directory: str, output_directory: str, result: FeaturesResult):
+	with connect_to_db() as cur:
+		cur.execute("SELECT uuid, file_path FROM recording")
+		rows = cur.fetchall()
+
+	full_paths = []
+	for row in rows:
+		uuid, file_path = str(row[0]), row[1]
+		if os.path.exists(feature_path(output_directory, uuid)):
+			continue
+		full_path = os.path.join(directory, file_path)
+		if not os.path.exists(full_path):
+			result.num_skipped += 1
+			continue
+		full_paths.append((uuid, full_path))
+	print(f"Computing features for {len(full_paths)} of {len(rows)} recordings")
+	return full_paths
+
+
+def _compute_one_second_features(item: Tuple[str, str]) -> np.ndarray:
+	return compute_features(item[1], 1.0)
+
+
+def compute_all_features(
+	directory: str,
+	output_directory: str,
+	result: FeaturesResult,
+	processes: Optional[int] = None,
+):
+	full_paths = get_files_to_process(directory, output_directory, result)
+	if not full_paths:
+		print("No features to compute")
+		return
+
+	os.makedirs(output_directory, exist_ok=True)
+	for (uuid, full_path), features, error in process_map(
+		_compute_one_second_features, full_paths, processes
+	):
+		if error:
+			print(f"Error computing features for {full_path}: {error}")
+			result.num_errored += 1
+			continue
+		np.save(feature_path(output_directory, uuid), features)
+		result.num_computed += 1
+
+
+def main():
+	root_directory = "/work/projects/tracker/mic/auto-sync"
+	result = FeaturesResult(root_directory=root_directory)
+	compute_all_features(root_directory, OUTPUT_DIRECTORY, result)
+	print(f"result: {result}")
+
+
+if __name__ == "__main__":
+	main()
@@ -1,21 +1,45 @@
+import argparse
 import datetime
 import os
 
-# from transformers.models.whisper import WhisperTimeStampLogitsProcessor
-import subprocess
-from typing import List, Optional, Tuple
+from typing import Dict, List, Literal, Optional, Tuple
 import random
-import tqdm
+import queue
+import concurrent.futures
+import multiprocessing
+import threading
+import time
+from dataclasses import dataclass, field
 from pydantic import BaseModel, Field
 
 import torch
 from transformers import AutoModelForSpeechSeq2Seq, AutoProcessor, pipeline
 from jobs.utils import connect_to_db
-import shutil
 import json
+import numpy as np
+import vad
+from jobs import asr_batching, audio_features
 
 
 EXTENSIONS = {".opus"}
+OUTPUT_DIRECTORY = "./outputs/transcriptions"
+# decoded recordings kept in memory for when they come around again, off
+# by default, a 2 hour file is 460MB of float32
+DECODE_CACHE_BYTES = 0
+# transcribe_parallel() cuts a recording into segments this long, each
+# overlapping the next so a word on a cut is heard whole by one of them
+PARALLEL_SEGMENT = datetime.timedelta(minutes=5)
+PARALLEL_OVERLAP = datetime.timedelta(seconds=10)
+# every one of its processes loads whisper, around a gigabyte of memory
+# each for whisper-small, so by default only one per this many cores
+CORES_PER_PARALLEL_WORKER = 4
+# ffmpeg processes decoding ahead of the model
+DECODE_THREADS = 2
+# decoded recordings waiting for the model, at 460MB for 2 hours of audio
+DECODED_QUEUE_SIZE = 2
+# transcriptions waiting to be written
+WRITTEN_QUEUE_SIZE = 16
+SAMPLE_RATE = 16000
 
 
 # move to schemas?
@@ -26,11 +50,20 @@ class TranscriptionResult(BaseModel):
 	# e.g. “openai/whisper-small” or “openai/whisper-medium”
 	model_name: str = Field(default="openai/whisper-small")
 	chunk_length: datetime.timedelta = Field(default=datetime.timedelta(seconds=30))
+	# chunks cut in the middle of speech overlap by both strides, like the
+	# pipeline's own chunking did, and are stitched back together
 	stride_length_begin: datetime.timedelta = Field(
 		default=datetime.timedelta(seconds=6)
 	)
 	stride_length_end: datetime.timedelta = Field(default=datetime.timedelta(seconds=0))
-	batch_size: int = Field(default=1)
+	# chunks, from any of the recordings in flight, per forward pass
+	batch_size: int = Field(default=8)
+	# how long a batch that isn't full waits for more chunks
+	max_batch_wait: datetime.timedelta = Field(default=datetime.timedelta(seconds=2))
+	# None for the fp32 model, "int8" for dynamic quantization of the linear
+	# layers, "bfloat16" for CPUs that have it. bin/compare_quantization.py
+	# compares them
+	quantization: Optional[Literal["int8", "bfloat16"]] = Field(default=None)
 
 
 class TimeTaken(BaseModel):
@@ -51,7 +84,9 @@ class FileTranscription(BaseModel):
 	result: TranscriptionResult
 	source_file: str
 
-	wav16k_file: str
+	# decoded through a pipe now, only set in older transcriptions
+	wav16k_file: Optional[str] = Field(default=None)
+	# decoding, None when it came from the cache
 	convertion_time: Optional[TimeTaken]
 
 	processing_time: TimeTaken
@@ -66,87 +101,56 @@ def create_asr(result: TranscriptionResult):
 		result.model_name,
 		attn_implementation="eager",
 	)
+	device = 0 if torch.cuda.is_available() else -1
+	torch_dtype = None
+	if result.quantization == "int8":
+		# int8 weights for every linear layer, activations quantized on the
+		# fly. only has CPU kernels
+		model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+		device = -1
+	elif result.quantization == "bfloat16":
+		model = model.to(torch.bfloat16)
+		# so the pipeline casts the input features too
+		torch_dtype = torch.bfloat16
 
-	chunk_length_s = 30
-	# ts_processor = WhisperTimeStampLogitsProcessor(
-	# 	processor.tokenizer,
-	# 	chunk_length_s=chunk_length_s,
-	# 	stride_length_s=5,
-	# )
 	asr = pipeline(
 		task="automatic-speech-recognition",
 		model=model,
 		tokenizer=processor.tokenizer,
 		feature_extractor=processor.feature_extractor,
-		# options: “char”, “word”, or “none”
-		# return_timestamps="word",
-		# split long files
-		# chunk_length_s=chunk_length_s,
-		# overlap 5s at start/end of each chunk
-		# stride_length_s=(5, 5),
-		device=0 if torch.cuda.is_available() else -1,
-		# batch_size=1,
-		# generate_kwargs={
-		# 	# "logits_processors": [ts_processor],
-		# 	"task": "transcribe",
-		# 	# "language":"<|tr|>",
-		# 	# language="en"
-		# }
+		device=device,
+		torch_dtype=torch_dtype,
 	)
 
 	def ret(*args, **kwargs):
+		# handed chunks of at most chunk_length by asr_batching, so the
+		# pipeline doesn't have to split them again
 		return asr(
 			*args,
 			**kwargs,
 			return_timestamps=True,
-			stride_length_s=(6, 0),
-			chunk_length_s=chunk_length_s,
-			batch_size=1,
+			batch_size=result.batch_size,
 		)
 
 	return ret
 
 
-def to_wav16k(source_directory: str, source_subpath: str, temporary_directory: str) -> Tuple[str, TimeTaken]:
-	src = os.path.join(source_directory, source_subpath)
-	dst = os.path.join(temporary_directory, source_subpath + ".wav16k.wav")
-	os.makedirs(os.path.dirname(dst), exist_ok=True)
-	if os.path.exists(dst):
-		return dst, None
-
-	print(f"Converting {src} to {dst}")
-
-	bigin_time = datetime.datetime.now()
-	try:
-		cmd = [
-			"ffmpeg", "-y",
-			"-i", str(src),
-			"-ar", "16000",
-			"-ac", "1",
-			str(dst)
-		]
-		subprocess.run(
-			cmd,
-			check=True,
-			# TODO: print to stdout
-			stdout=subprocess.DEVNULL,
-			stderr=subprocess.DEVNULL
-		)
-		return dst, TimeTaken(
-			begin_time=bigin_time,
-			end_time=datetime.datetime.now()
-		)
-	except subprocess.CalledProcessError as e:
-		print(f"Error converting {src} to wav16k: {e}")
-		shutil.rmtree(os.path.dirname(dst), ignore_errors=True)
-		return None, None
+@dataclass
+class PendingRecording:
+	uuid: str
+	file_path: str
+	begin_date: datetime.datetime
+	audio_length: Optional[datetime.timedelta] = None
+	# None until jobs/vad_index.py got to it
+	active_regions: Optional[np.ndarray] = None
 
 
-def get_recording(file_path: str) -> Optional[TranscriptionResult]:
+def get_recording(file_path: str) -> Optional[PendingRecording]:
+	"""A recording whether or not it was transcribed already."""
 	with connect_to_db() as cur:
 		cur.execute(
 			"""
-			SELECT uuid, begin_date, audio_length, source
+			SELECT uuid, begin_date, audio_length, active_regions
 			FROM recording
 			WHERE file_path = %s
 			""",
@@ -156,75 +160,361 @@ def get_recording(file_path: str) -> Optional[TranscriptionResult]:
 	if not row:
 		print(f"Recording not found in database: {file_path}")
 		return None
-	uuid, begin_date, audio_length, source = row
-	return uuid, begin_date
+	uuid, begin_date, audio_length, active_regions = row
+	if active_regions is not None:
+		active_regions = vad.from_bytes(active_regions)
+	return PendingRecording(str(uuid), file_path, begin_date, audio_length, active_regions)
 
 
-def extract_text(result: TranscriptionResult, file_path: str):
+def transcription_path(output_directory: str, uuid: str) -> str:
+	return os.path.join(output_directory, f"{uuid}.json")
 
-	# result: TranscriptionResult
-	# source_file: str
 
-	# convert_file: str
-	# convert_time: Optional[TimeTaken]
+def get_pending(result: TranscriptionResult, output_directory: str) -> List[PendingRecording]:
+	"""Recordings without a transcription yet, in a fixed shuffled order."""
+	with connect_to_db() as cur:
+		cur.execute(
+			"""
+			SELECT uuid, file_path, begin_date, audio_length, active_regions
+			FROM recording
+			ORDER BY file_path
+			"""
+		)
+		rows = cur.fetchall()
+
+	pending = []
+	for uuid, file_path, begin_date, audio_length, active_regions in rows:
+		uuid = str(uuid)
+		if os.path.splitext(file_path)[1] not in EXTENSIONS:
+			continue
+		if os.path.exists(transcription_path(output_directory, uuid)):
+			continue
+		if not os.path.exists(os.path.join(result.root_directory, file_path)):
+			continue
+		if active_regions is not None:
+			active_regions = vad.from_bytes(active_regions)
+		pending.append(PendingRecording(uuid, file_path, begin_date, audio_length, active_regions))
+	# spread over the whole archive rather than oldest first
+	random.Random(1776).shuffle(pending)
+	return pending
+
+
+@dataclass
+class InFlight:
+	"""A recording whose chunks are somewhere between decoded and transcribed."""
+	recording: PendingRecording
+	convertion_time: Optional[TimeTaken]
+	audio_seconds: float
+	num_chunks: int
+	# asr_batching.chunk_span() of each chunk, for stitching them together
+	spans: List[Tuple[float, float]]
+	entries: Dict[int, List[TranscriptionEntry]] = field(default_factory=dict)
+	# when its first chunk went into the model
+	begin_time: Optional[datetime.datetime] = None
+	failed: bool = False
+
+
+@dataclass
+class Chunk:
+	owner: InFlight
+	index: int
+	audio: np.ndarray
+	# vad.gather() offsets, chunk time to recording time
+	offsets: np.ndarray
+
+
+def to_entries(output: dict, offsets: np.ndarray, shift: float = 0.0) -> List[TranscriptionEntry]:
+	"""The pipeline's output for one chunk, in seconds of the recording."""
+	def realign(seconds, end=False):
+		seconds = vad.realign(seconds, offsets, end=end)
+		return seconds + shift if seconds is not None else None
+
+	entries = []
+	for piece in output.get("chunks", []):
+		start, end = piece["timestamp"]
+		entries.append(
+			TranscriptionEntry(
+				start=realign(start),
+				end=realign(end, end=True),
+				text=piece["text"],
+			)
+		)
+	return entries
 
-	# processing_time: TimeTaken
-	# entries: List[TranscriptionEntry] = field(default_factory=list)
 
-	source_directory = result.root_directory
-	uuid, begin_date = get_recording(file_path)
-	if not begin_date:
-		print(f"Recording not found in database: {file_path}")
-		return
-
-	destination = "./outputs/wavs/"
+def stitch_chunks(chunks: List[Tuple[float, float, List[TranscriptionEntry]]]) -> List[TranscriptionEntry]:
+	"""The entries of consecutive chunks or segments, without what their overlaps heard twice."""
+	stitched = asr_batching.stitch(
+		[
+			(start, end, [(entry.start, entry.end, entry.text or "") for entry in entries])
+			for start, end, entries in chunks
+		]
+	)
+	return [TranscriptionEntry(start=start, end=end, text=text) for start, end, text in stitched]
 
-	wav16, convertion_time = to_wav16k(source_directory, file_path, destination)
-	if not wav16:
-		print(f"Error converting {file_path} to wav16k")
-		return
 
-	asr = create_asr(result)
-	begin_time = datetime.datetime.now()
-	result = asr(wav16)
-	processing_time = TimeTaken(
-		begin_time=begin_time,
-		end_time=datetime.datetime.now()
-	)
+def chunk_overlap(result: TranscriptionResult) -> float:
+	# the same strides the pipeline used to apply when it did the chunking
+	return (result.stride_length_begin + result.stride_length_end).total_seconds()
 
-	transcription = FileTranscription(
-		uuid=uuid,
-		begin_date=begin_date,
-		result=result,
-		source_file=file_path,
-		wav16k_file=wav16,
-		convertion_time=convertion_time,
-		processing_time=processing_time,
-	)
 
-	with open("./outputs/wavs/log.txt", "a") as f:
-		for chunk in result.get("chunks", []):
-			start, end = chunk["timestamp"]
-			text = chunk["text"]
-			transcription.entries.append(
-				TranscriptionEntry(
-					start=start,
-					end=end,
-					text=text,
-				)
-			)
-			text = text.strip()
+def write_transcription(output_directory: str, transcription: FileTranscription):
+	os.makedirs(output_directory, exist_ok=True)
+	processing_time = transcription.processing_time
+	with open(os.path.join(output_directory, "log.txt"), "a") as f:
+		for entry in transcription.entries:
+			text = (entry.text or "").strip()
 			if not text:
 				continue
-			if not end:
-				end = -1
-			if not start:
-				start = -1
-			f.write(f"[{file_path}][{begin_date}][{processing_time}][{start:06.2f} - {end:06.2f}] {text}\n")
-	
-	current_time = datetime.datetime.now().strftime("%Y-%m-%d_%H_%M_%S")
-	with open(f"./outputs/wavs/{current_time}.json", "w") as f:
+			start = entry.start if entry.start else -1
+			end = entry.end if entry.end else -1
+			f.write(f"[{transcription.source_file}][{transcription.begin_date}][{processing_time}][{start:06.2f} - {end:06.2f}] {text}\n")
+
+	# named after the recording, so a rerun knows what is done
+	path = transcription_path(output_directory, transcription.uuid)
+	with open(path + ".tmp", "w") as f:
 		f.write(transcription.model_dump_json(indent=2))
+	os.replace(path + ".tmp", path)
+
+
+class TranscriptionWorker:
+	"""
+	Loads the model once, then transcribes recordings pulled from a queue
+	until it gets None. Loading whisper takes longer than transcribing a
+	short file, so it is paid once per process.
+
+	Recordings are cut into chunk_length chunks, overlapping where a cut
+	falls in speech, and the chunks of every recording in flight go
+	through the model batch_size at a time. A batch
+	that isn't full goes anyway once its oldest chunk has waited
+	max_batch_wait, so a lone file doesn't wait for company.
+
+	A run is three stages connected by bounded queues: decoder threads
+	running ffmpeg, inference on the calling thread, and a writer thread.
+	ffmpeg and torch both run outside the GIL, so the next recordings are
+	decoded while the model works on the current ones.
+	"""
+
+	def __init__(
+		self,
+		result: TranscriptionResult,
+		output_directory: str = OUTPUT_DIRECTORY,
+		decode_cache_bytes: int = DECODE_CACHE_BYTES,
+		decoders: int = DECODE_THREADS,
+	):
+		self.result = result
+		self.output_directory = output_directory
+		self.decode_cache = audio_features.DecodeCache(decode_cache_bytes)
+		self.decoders = decoders
+		self.num_transcribed = 0
+		self.num_errored = 0
+		self.throughput = asr_batching.Throughput()
+		self.stats: Dict[str, asr_batching.StageStats] = {}
+		# counters and the decode cache are shared by the stages
+		self.lock = threading.Lock()
+
+		begin_time = datetime.datetime.now()
+		self.asr = create_asr(result)
+		self.startup_time = TimeTaken(begin_time=begin_time, end_time=datetime.datetime.now())
+		print(f"Loaded {result.model_name} in {self.startup_time.end_time - begin_time}")
+
+	def decode(self, recording: PendingRecording) -> Tuple[np.ndarray, Optional[TimeTaken]]:
+		"""16kHz samples straight from an ffmpeg pipe, no wav16k files."""
+		with self.lock:
+			samples = self.decode_cache.get(recording.uuid)
+		if samples is not None:
+			return samples, None
+		begin_time = datetime.datetime.now()
+		expected = recording.audio_length.total_seconds() if recording.audio_length else None
+		samples = audio_features.decode(
+			os.path.join(self.result.root_directory, recording.file_path),
+			SAMPLE_RATE,
+			expected,
+		)
+		with self.lock:
+			self.decode_cache.put(recording.uuid, samples)
+		return samples, TimeTaken(begin_time=begin_time, end_time=datetime.datetime.now())
+
+	def start(self, recording: PendingRecording) -> Tuple[InFlight, List[Chunk]]:
+		"""Decodes a recording and cuts it into chunks for the scheduler."""
+		samples, convertion_time = self.decode(recording)
+		# only where there is voice, once jobs/vad_index.py got to it
+		pieces = asr_batching.split_chunks(
+			samples,
+			recording.active_regions,
+			SAMPLE_RATE,
+			self.result.chunk_length.total_seconds(),
+			chunk_overlap(self.result),
+		)
+		owner = InFlight(
+			recording=recording,
+			convertion_time=convertion_time,
+			audio_seconds=len(samples) / SAMPLE_RATE,
+			num_chunks=len(pieces),
+			spans=[asr_batching.chunk_span(audio, offsets, SAMPLE_RATE) for audio, offsets in pieces],
+		)
+		return owner, [Chunk(owner, i, audio, offsets) for i, (audio, offsets) in enumerate(pieces)]
+
+	def infer(self, batch: List[Chunk]) -> List[InFlight]:
+		"""Runs a batch, returns the recordings it completed."""
+		batch = [chunk for chunk in batch if not chunk.owner.failed]
+		if not batch:
+			return []
+		begin_time = datetime.datetime.now()
+		for chunk in batch:
+			if not chunk.owner.begin_time:
+				chunk.owner.begin_time = begin_time
+		try:
+			outputs = self.asr([{"raw": chunk.audio, "sampling_rate": SAMPLE_RATE} for chunk in batch])
+		except Exception as e:
+			for chunk in batch:
+				self.fail(chunk.owner, e)
+			return []
+
+		done = []
+		for chunk, output in zip(batch, outputs):
+			chunk.owner.entries[chunk.index] = to_entries(output, chunk.offsets)
+			if len(chunk.owner.entries) == chunk.owner.num_chunks:
+				done.append(chunk.owner)
+		return done
+
+	def fail(self, owner: InFlight, error: Exception):
+		with self.lock:
+			if owner.failed:
+				return
+			owner.failed = True
+			self.num_errored += 1
+		print(f"Error transcribing {owner.recording.file_path}: {error}")
+
+	def transcription(self, owner: InFlight) -> FileTranscription:
+		recording = owner.recording
+		transcription = FileTranscription(
+			uuid=recording.uuid,
+			begin_date=recording.begin_date,
+			result=self.result,
+			source_file=recording.file_path,
+			convertion_time=owner.convertion_time,
+			processing_time=TimeTaken(
+				begin_time=owner.begin_time or datetime.datetime.now(),
+				end_time=datetime.datetime.now()
+			),
+		)
+		transcription.entries = stitch_chunks(
+			[(*owner.spans[i], owner.entries[i]) for i in range(owner.num_chunks)]
+		)
+		return transcription
+
+	def write(self, transcription: FileTranscription):
+		write_transcription(self.output_directory, transcription)
+
+	def transcribe_segment(self, recording: PendingRecording, start: float, end: float) -> List[TranscriptionEntry]:
+		"""[start, end) seconds of a recording, right away rather than through run()."""
+		samples = audio_features.decode(
+			os.path.join(self.result.root_directory, recording.file_path),
+			SAMPLE_RATE,
+			end - start,
+			offset=start,
+			duration=end - start,
+		)
+		regions = None
+		if recording.active_regions is not None:
+			regions = vad.clip(recording.active_regions, round(start * 1000), round(end * 1000))
+		pieces = asr_batching.split_chunks(
+			samples, regions, SAMPLE_RATE, self.result.chunk_length.total_seconds(), chunk_overlap(self.result)
+		)
+		chunks = []
+		for i in range(0, len(pieces), self.result.batch_size):
+			batch = pieces[i : i + self.result.batch_size]
+			outputs = self.asr([{"raw": audio, "sampling_rate": SAMPLE_RATE} for audio, _ in batch])
+			for (audio, offsets), output in zip(batch, outputs):
+				chunk_start, chunk_end = asr_batching.chunk_span(audio, offsets, SAMPLE_RATE)
+				chunks.append((chunk_start + start, chunk_end + start, to_entries(output, offsets, start)))
+		return stitch_chunks(chunks)
+
+	def decode_stage(self, pending: "queue.Queue[Optional[PendingRecording]]", decoded: queue.Queue):
+		while True:
+			recording = pending.get()
+			if recording is None:
+				# for the other decoders
+				pending.put(None)
+				decoded.put(None)
+				return
+			try:
+				with self.stats["decode"].busy():
+					owner, chunks = self.start(recording)
+			except Exception as e:
+				print(f"Error decoding {recording.file_path}: {e}")
+				with self.lock:
+					self.num_errored += 1
+				continue
+			# blocks while inference is behind, which bounds the memory
+			decoded.put((owner, chunks))
+
+	def infer_stage(self, decoded: queue.Queue, written: queue.Queue):
+		scheduler = asr_batching.BatchScheduler(
+			self.result.batch_size, self.result.max_batch_wait.total_seconds()
+		)
+		decoding = self.decoders
+		while decoding or len(scheduler):
+			batch = scheduler.next_batch(flush=not decoding)
+			if batch:
+				with self.stats["infer"].busy():
+					done = self.infer(batch)
+				for owner in done:
+					written.put(owner)
+				continue
+			try:
+				# no longer than the waiting chunks can afford
+				item = decoded.get(timeout=scheduler.timeout())
+			except queue.Empty:
+				continue
+			if item is None:
+				decoding -= 1
+				continue
+			owner, chunks = item
+			if not chunks:
+				print(f"No voice in {owner.recording.file_path}")
+				written.put(owner)
+			for chunk in chunks:
+				scheduler.add(chunk)
+
+	def write_stage(self, written: queue.Queue):
+		while True:
+			owner = written.get()
+			if owner is None:
+				return
+			try:
+				with self.stats["write"].busy():
+					transcription = self.transcription(owner)
+					self.write(transcription)
+			except Exception as e:
+				self.fail(owner, e)
+				continue
+			with self.lock:
+				self.num_transcribed += 1
+				self.throughput.audio_seconds += owner.audio_seconds
+			took = transcription.processing_time.end_time - transcription.processing_time.begin_time
+			print(f"Transcribed {owner.recording.file_path} in {took}, {len(transcription.entries)} entries, {self.throughput.audio_hours_per_hour():.1f} audio hours per hour")
+
+	def run(self, pending: "queue.Queue[Optional[PendingRecording]]"):
+		self.stats = {
+			"decode": asr_batching.StageStats("decode", self.decoders),
+			"infer": asr_batching.StageStats("infer"),
+			"write": asr_batching.StageStats("write"),
+		}
+		decoded = queue.Queue(maxsize=DECODED_QUEUE_SIZE)
+		written = queue.Queue(maxsize=WRITTEN_QUEUE_SIZE)
+		# the decoders are done once inference has seen all their Nones
+		for _ in range(self.decoders):
+			threading.Thread(target=self.decode_stage, args=(pending, decoded), daemon=True).start()
+		writer = threading.Thread(target=self.write_stage, args=(written,), daemon=True)
+		writer.start()
+		try:
+			self.infer_stage(decoded, written)
+		finally:
+			written.put(None)
+			writer.join()
+		print(", ".join(str(stats) for stats in self.stats.values()))
 
 
 def create_job() -> TranscriptionResult:
@@ -258,19 +548,289 @@ def create_job() -> TranscriptionResult:
 	return result
 
 
-def main():
+@dataclass
+class ShardReport:
+	index: int
+	threads: int
+	num_transcribed: int
+	num_errored: int
+	audio_seconds: float
+	# from before loading the model to the last write, or from the start of
+	# the shard when its process had the model loaded already
+	wall_seconds: float
+	startup_seconds: float
+	utilization: Dict[str, float] = field(default_factory=dict)
+
+	@property
+	def real_time_factor(self) -> float:
+		return self.wall_seconds / self.audio_seconds if self.audio_seconds else 0.0
+
+
+def _report_shard(worker: TranscriptionWorker, recordings: List[PendingRecording], index: int, threads: int, began: float, startup_seconds: float) -> ShardReport:
+	# the worker can outlive the shard, only what this shard did counts
+	num_transcribed = worker.num_transcribed
+	num_errored = worker.num_errored
+	audio_seconds = worker.throughput.audio_seconds
+	pending = queue.Queue()
+	for recording in recordings:
+		pending.put(recording)
+	pending.put(None)
+	worker.run(pending)
+	return ShardReport(
+		index=index,
+		threads=threads,
+		num_transcribed=worker.num_transcribed - num_transcribed,
+		num_errored=worker.num_errored - num_errored,
+		audio_seconds=worker.throughput.audio_seconds - audio_seconds,
+		wall_seconds=time.monotonic() - began,
+		startup_seconds=startup_seconds,
+		utilization={name: stats.utilization() for name, stats in worker.stats.items()},
+	)
+
+
+def run_shard(
+	result: TranscriptionResult,
+	recordings: List[PendingRecording],
+	index: int,
+	threads: int,
+	output_directory: str = OUTPUT_DIRECTORY,
+) -> ShardReport:
+	"""One process of a sharded run, with its own model and torch threads."""
+	torch.set_num_threads(threads)
+	began = time.monotonic()
+	worker = TranscriptionWorker(result, output_directory)
+	startup_seconds = (worker.startup_time.end_time - worker.startup_time.begin_time).total_seconds()
+	return _report_shard(worker, recordings, index, threads, began, startup_seconds)
+
+
+# the worker of a ShardPool process, and when it started loading its model
+# if no shard has paid for that yet
+shard_worker: Optional[TranscriptionWorker] = None
+shard_worker_began: Optional[float] = None
+
+
+def _init_shard_worker(result: TranscriptionResult, threads: int, output_directory: str):
+	global shard_worker, shard_worker_began
+	torch.set_num_threads(threads)
+	shard_worker_began = time.monotonic()
+	shard_worker = TranscriptionWorker(result, output_directory)
+
+
+def _run_pooled_shard(recordings: List[PendingRecording], index: int, threads: int) -> ShardReport:
+	global shard_worker_began
+	began, startup_seconds = time.monotonic(), 0.0
+	if shard_worker_began is not None:
+		# the first shard of this process includes loading the model
+		began = shard_worker_began
+		startup_seconds = (shard_worker.startup_time.end_time - shard_worker.startup_time.begin_time).total_seconds()
+		shard_worker_began = None
+	return _report_shard(shard_worker, recordings, index, threads, began, startup_seconds)
+
+
+class ShardPool:
+	"""
+	workers processes, each with threads torch threads and the cores divided
+	between them by default. Every process loads the model once and keeps it
+	for every run() after that, so a polling job only pays for it at start.
+	"""
+
+	def __init__(
+		self,
+		result: TranscriptionResult,
+		workers: int,
+		threads: Optional[int] = None,
+		output_directory: str = OUTPUT_DIRECTORY,
+	):
+		self.workers = workers
+		self.threads = threads or max((os.cpu_count() or 1) // workers, 1)
+		# fork doesn't mix with torch's thread pools
+		self.pool = concurrent.futures.ProcessPoolExecutor(
+			workers,
+			mp_context=multiprocessing.get_context("spawn"),
+			initializer=_init_shard_worker,
+			initargs=(result, self.threads, output_directory),
+		)
+
+	def __enter__(self) -> "ShardPool":
+		return self
+
+	def __exit__(self, *args):
+		self.close()
+
+	def close(self):
+		self.pool.shutdown()
+
+	def run(self, recordings: List[PendingRecording]) -> Tuple[List[ShardReport], float]:
+		"""
+		The recordings split over the processes by audio length. Returns the
+		report of every shard and the wall time of the whole run.
+		"""
+		shards = asr_batching.shard(
+			recordings,
+			self.workers,
+			lambda recording: recording.audio_length.total_seconds() if recording.audio_length else 0.0,
+		)
+		print(f"Transcribing {len(recordings)} recordings in {self.workers} processes of {self.threads} threads")
+		began = time.monotonic()
+		futures = [
+			self.pool.submit(_run_pooled_shard, shard, i, self.threads)
+			for i, shard in enumerate(shards)
+			# fewer recordings than workers
+			if shard
+		]
+		reports = [future.result() for future in futures]
+		wall_seconds = time.monotonic() - began
+		print_reports(reports, wall_seconds)
+		return reports, wall_seconds
+
+
+def run_sharded(
+	result: TranscriptionResult,
+	recordings: List[PendingRecording],
+	workers: int,
+	threads: Optional[int] = None,
+	output_directory: str = OUTPUT_DIRECTORY,
+) -> Tuple[List[ShardReport], float]:
+	"""A single ShardPool run, models loaded and all."""
+	with ShardPool(result, workers, threads, output_directory) as pool:
+		return pool.run(recordings)
+
+
+# the worker of a transcribe_parallel() process
+segment_worker: Optional[TranscriptionWorker] = None
+
+
+def _init_segment_worker(result: TranscriptionResult, threads: int):
+	global segment_worker
+	torch.set_num_threads(threads)
+	segment_worker = TranscriptionWorker(result)
+
+
+def _transcribe_segment(recording: PendingRecording, start: float, end: float) -> List[TranscriptionEntry]:
+	return segment_worker.transcribe_segment(recording, start, end)
+
+
+def transcribe_parallel(
+	result: TranscriptionResult,
+	recording: PendingRecording,
+	workers: Optional[int] = None,
+	threads: Optional[int] = None,
+) -> FileTranscription:
+	"""
+	One recording cut into overlapping segments that are transcribed in
+	workers processes at once, for a fresh recording that should be
+	searchable soon rather than in backlog order. Every process loads its
+	own model, so it only pays off for long recordings.
+	"""
+	workers = workers or max((os.cpu_count() or 1) // CORES_PER_PARALLEL_WORKER, 1)
+	threads = threads or max((os.cpu_count() or 1) // workers, 1)
+	segments = asr_batching.overlapping_segments(
+		recording.audio_length.total_seconds(),
+		PARALLEL_SEGMENT.total_seconds(),
+		PARALLEL_OVERLAP.total_seconds(),
+	)
+	workers = max(min(workers, len(segments)), 1)
+	print(f"Transcribing {recording.file_path} as {len(segments)} segments in {workers} processes")
+
+	begin_time = datetime.datetime.now()
+	context = multiprocessing.get_context("spawn")
+	with concurrent.futures.ProcessPoolExecutor(
+		workers,
+		mp_context=context,
+		initializer=_init_segment_worker,
+		initargs=(result, threads),
+	) as pool:
+		futures = [
+			pool.submit(_transcribe_segment, recording, start, end)
+			for start, end in segments
+		]
+		results = [future.result() for future in futures]
+
+	return FileTranscription(
+		uuid=recording.uuid,
+		begin_date=recording.begin_date,
+		result=result,
+		source_file=recording.file_path,
+		# decoded a segment at a time by the processes
+		convertion_time=None,
+		processing_time=TimeTaken(begin_time=begin_time, end_time=datetime.datetime.now()),
+		entries=stitch_chunks([(start, end, entries) for (start, end), entries in zip(segments, results)]),
+	)
+
+
+def print_reports(reports: List[ShardReport], wall_seconds: float):
+	for report in reports:
+		utilization = ", ".join(f"{name} {value:.0%}" for name, value in report.utilization.items())
+		print(f"shard {report.index}: {report.num_transcribed} transcribed, {report.num_errored} errors, {report.audio_seconds / 3600:.2f} audio hours, real time factor {report.real_time_factor:.3f}, startup {report.startup_seconds:.1f}s, {utilization}")
+	audio_seconds = sum(report.audio_seconds for report in reports)
+	if audio_seconds:
+		# lower is better, 0.1 is an hour of audio in 6 minutes
+		print(f"aggregate real time factor {wall_seconds / audio_seconds:.3f}, {audio_seconds / wall_seconds:.1f} audio hours per hour")
+
+
+def main(
+	poll_interval: Optional[float] = None,
+	workers: Optional[int] = None,
+	threads: Optional[int] = None,
+	file_path: Optional[str] = None,
+):
 	result = create_job()
-	random.seed(1776)
-	paths = os.listdir(result.root_directory)
-	random.shuffle(paths)
-	print(f"Found {len(paths)} files")
-	# paths = ["2025-04-13_03-06-44.opus"]
-	for path in tqdm.tqdm(paths):
-		extract_text(result, path)
+	if file_path:
+		# one recording, split over the cores
+		recording = get_recording(file_path)
+		if not recording:
+			return
+		transcription = transcribe_parallel(result, recording, workers, threads)
+		write_transcription(OUTPUT_DIRECTORY, transcription)
+		audio_seconds = recording.audio_length.total_seconds()
+		took = transcription.processing_time.end_time - transcription.processing_time.begin_time
+		print(f"Transcribed {file_path} in {took}, {len(transcription.entries)} entries, real time factor {took.total_seconds() / audio_seconds:.3f}")
+		return
+
+	workers = workers or 1
+	if workers > 1:
+		# a model per process, kept for every pass like the single worker's
+		with ShardPool(result, workers, threads) as pool:
+			while True:
+				recordings = get_pending(result, OUTPUT_DIRECTORY)
+				print(f"Found {len(recordings)} recordings to transcribe")
+				if recordings:
+					pool.run(recordings)
+				if poll_interval is None:
+					return
+				time.sleep(poll_interval)
+
+	if threads:
+		torch.set_num_threads(threads)
+	worker = TranscriptionWorker(result)
+	while True:
+		pending = queue.Queue()
+		recordings = get_pending(result, OUTPUT_DIRECTORY)
+		print(f"Found {len(recordings)} recordings to transcribe")
+		for recording in recordings:
+			pending.put(recording)
+		pending.put(None)
+		worker.run(pending)
+		throughput = worker.throughput
+		print(f"Transcribed {worker.num_transcribed}, {worker.num_errored} errors, {throughput.audio_seconds / 3600:.2f} audio hours at {throughput.audio_hours_per_hour():.1f} audio hours per hour")
+		# keep the model around for whatever gets synchronized next
+		if poll_interval is None:
+			return
+		time.sleep(poll_interval)
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+	parser = argparse.ArgumentParser(description="Transcribe the recordings that have no transcription yet")
+	parser.add_argument("--workers", type=int, default=None, help="processes, each with its own model")
+	parser.add_argument("--threads", type=int, default=None, help="torch threads per process")
+	parser.add_argument("--poll-interval", type=float, default=None, help="seconds between passes, one pass and exit without it")
+	parser.add_argument("--file", default=None, help="only this recording, relative to the root directory, split over --workers processes")
+	return parser.parse_args(argv)
 
 
 if __name__ == "__main__":
-	main()
+	args = parse_args()
+	main(poll_interval=args.poll_interval, workers=args.workers, threads=args.threads, file_path=args.file)
 
 
 
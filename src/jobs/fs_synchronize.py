@@ -7,7 +7,9 @@ import psycopg2
 import tqdm
 from mutagen.oggopus import OggOpus
 
+import ogg
 from common import normalize_datetime
+from jobs.rollups import prune_rollups, with_rollups
 from jobs.utils import connect_to_db
 
 pattern = re.compile(r"(\d{4}-\d{2}-\d{2})_(\d{2}-\d{2}-\d{2})\.opus")
@@ -22,6 +24,7 @@ class SynchronizationResult:
 	# already exist vs file still present, is there a difference?
 	num_unchanged: int = field(default=0)
 	num_removed: int = field(default=0)
+	num_unindexed: int = field(default=0)
 	# num_updated: int
 
 
@@ -39,25 +42,41 @@ def add_new_recording(directory, fname, result: SynchronizationResult):
 	audio_length = timedelta(seconds=audio.info.length)
 	disk_usage = os.path.getsize(path)
 
+	insert = """
+		INSERT INTO recording (
+			file_path,
+			begin_date,
+			audio_length,
+			source,
+			disk_usage
+		)
+		VALUES (%s, %s, %s, 'stationary', %s)
+		ON CONFLICT (file_path) DO NOTHING
+	"""
 	with connect_to_db() as cur:
+		# rowcount counts the rollup rows, 0 if the recording was already there
 		cur.execute(
-			"""
-			INSERT INTO recording (
-				file_path,
-				begin_date,
-				audio_length,
-				source,
-				disk_usage
-			)
-			VALUES (%s, %s, %s, 'stationary', %s)
-			ON CONFLICT (file_path) DO NOTHING;
-			""",
+			with_rollups(insert, 1),
 			(fname, begin, audio_length, disk_usage),
 		)
 	if cur.rowcount > 0:
 		result.num_inserted += 1
 	else:
 		result.num_unchanged += 1
+		return
+
+	try:
+		with open(path, "rb") as f:
+			ogg_index = ogg.build_index(f).to_bytes()
+	except ValueError as e:
+		print(f"Error indexing {path}: {e}")
+		result.num_unindexed += 1
+		return
+	with connect_to_db() as cur:
+		cur.execute(
+			"UPDATE recording SET ogg_index = %s WHERE file_path = %s",
+			(ogg_index, fname),
+		)
 
 
 def add_new_recordings(directory, result: SynchronizationResult):
@@ -81,8 +100,13 @@ def remove_missing_recordings(directory, result: SynchronizationResult):
 		if os.path.exists(full_path):
 			continue
 		with connect_to_db() as cur:
-			cur.execute("DELETE FROM recording WHERE uuid = %s", (uuid,))
+			cur.execute(
+				with_rollups("DELETE FROM recording WHERE uuid = %s", -1), (uuid,)
+			)
 		result.num_removed += 1
+	if result.num_removed:
+		with connect_to_db() as cur:
+			prune_rollups(cur)
 
 
 def main():
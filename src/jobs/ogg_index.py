@@ -0,0 +1,72 @@
+import os
+from dataclasses import dataclass, field
+
+import tqdm
+
+import ogg
+from jobs.utils import connect_to_db
+
+
+@dataclass
+class OggIndexResult:
+	root_directory: str
+	num_indexed: int = field(default=0)
+	num_skipped: int = field(default=0)
+	num_errored: int = field(default=0)
+
+
+def get_files_to_index(directory: str, result: OggIndexResult):
+	with connect_to_db() as cur:
+		cur.execute("SELECT uuid, file_path FROM recording WHERE ogg_index IS NULL")
+		rows = cur.fetchall()
+	print(f"Indexing {len(rows)} recordings")
+
+	full_paths = []
+	for row in rows:
+		uuid, file_path = row[0], row[1]
+		full_path = os.path.join(directory, file_path)
+		if not os.path.exists(full_path):
+			result.num_skipped += 1
+			continue
+		full_paths.append((uuid, full_path))
+	return full_paths
+
+
+def index_recording(uuid: str, full_path: str, result: OggIndexResult):
+	with open(full_path, "rb") as f:
+		ogg_index = ogg.build_index(f).to_bytes()
+	with connect_to_db() as cur:
+		cur.execute(
+			"UPDATE recording SET ogg_index = %s WHERE uuid = %s",
+			(ogg_index, uuid),
+		)
+	if cur.rowcount < 1:
+		print(f"That is odd: {uuid} not found in database")
+		return
+	result.num_indexed += 1
+
+
+def index_recordings(directory: str, result: OggIndexResult):
+	full_paths = get_files_to_index(directory, result)
+	if not full_paths:
+		print("No files to index")
+		return
+
+	for uuid, full_path in tqdm.tqdm(full_paths):
+		try:
+			index_recording(uuid, full_path, result)
+		except Exception as e:
+			print(f"Error indexing {full_path}: {e}")
+			result.num_errored += 1
+			continue
+
+
+def main():
+	root_directory = "/work/projects/tracker/mic/auto-sync"
+	result = OggIndexResult(root_directory=root_directory)
+	index_recordings(root_directory, result)
+	print(f"result: {result}")
+
+
+if __name__ == "__main__":
+	main()
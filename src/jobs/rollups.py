@@ -0,0 +1,71 @@
+from jobs.utils import connect_to_db
+
+# rows of the `changed` CTE added to (sign 1) or taken out of (sign -1)
+# the hour and day buckets they begin in
+UPSERT_ROLLUPS = """
+	INSERT INTO recording_rollup AS r (
+		bucket,
+		bucket_start,
+		source,
+		num_recordings,
+		sum_audio_length,
+		sum_disk_usage
+	)
+	SELECT
+		bucket,
+		date_trunc(bucket, begin_date AT TIME ZONE 'UTC') AT TIME ZONE 'UTC',
+		coalesce(source, ''),
+		{sign} * count(*),
+		{sign} * sum(audio_length),
+		{sign} * coalesce(sum(disk_usage), 0)
+	FROM changed CROSS JOIN unnest(ARRAY['hour', 'day']) AS bucket
+	GROUP BY 1, 2, 3
+	ON CONFLICT (bucket, source, bucket_start) DO UPDATE SET
+		num_recordings = r.num_recordings + EXCLUDED.num_recordings,
+		sum_audio_length = r.sum_audio_length + EXCLUDED.sum_audio_length,
+		sum_disk_usage = r.sum_disk_usage + EXCLUDED.sum_disk_usage
+"""
+
+
+def with_rollups(statement: str, sign: int) -> str:
+	"""
+	An INSERT into or DELETE from recording that updates the rollups in
+	the same statement, so the two can't drift apart.
+
+	cur.rowcount is then the number of rollup rows touched, which is
+	still 0 when the statement itself changed nothing.
+	"""
+	return (
+		f"WITH changed AS ({statement.strip().rstrip(';')} "
+		"RETURNING begin_date, source, audio_length, disk_usage)"
+		+ UPSERT_ROLLUPS.format(sign=sign)
+	)
+
+
+def prune_rollups(cur):
+	cur.execute("DELETE FROM recording_rollup WHERE num_recordings <= 0")
+
+
+def rebuild_rollups():
+	with connect_to_db() as cur:
+		cur.execute("BEGIN")
+		cur.execute("TRUNCATE recording_rollup")
+		cur.execute(
+			"""
+			WITH changed AS (
+				SELECT begin_date, source, audio_length, disk_usage FROM recording
+			)
+			"""
+			+ UPSERT_ROLLUPS.format(sign=1)
+		)
+		cur.execute("COMMIT")
+		cur.execute("SELECT bucket, count(*) FROM recording_rollup GROUP BY bucket")
+		return dict(cur.fetchall())
+
+
+def main():
+	print(f"Rebuilt rollups: {rebuild_rollups()}")
+
+
+if __name__ == "__main__":
+	main()
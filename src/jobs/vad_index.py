@@ -0,0 +1,88 @@
+import os
+from dataclasses import dataclass, field
+from typing import Tuple
+
+import numpy as np
+
+import vad
+from jobs import audio_features
+from jobs.utils import connect_to_db
+
+
+@dataclass
+class VadIndexResult:
+	root_directory: str
+	num_indexed: int = field(default=0)
+	num_skipped: int = field(default=0)
+	num_errored: int = field(default=0)
+	# over everything indexed this run
+	total_seconds: float = field(default=0.0)
+	active_seconds: float = field(default=0.0)
+
+
+def get_files_to_index(directory: str, result: VadIndexResult):
+	with connect_to_db() as cur:
+		cur.execute(
+			"SELECT uuid, file_path FROM recording WHERE active_regions IS NULL"
+		)
+		rows = cur.fetchall()
+	print(f"Finding voice activity in {len(rows)} recordings")
+
+	full_paths = []
+	for row in rows:
+		uuid, file_path = str(row[0]), row[1]
+		full_path = os.path.join(directory, file_path)
+		if not os.path.exists(full_path):
+			result.num_skipped += 1
+			continue
+		full_paths.append((uuid, full_path))
+	return full_paths
+
+
+def compute_regions(full_path: str) -> Tuple[np.ndarray, float]:
+	"""The active regions of a file, and how long it is in seconds."""
+	features = audio_features.compute_features(full_path, vad.FRAME_SECONDS)
+	rms = features[:, audio_features.RMS]
+	return vad.detect(rms, vad.FRAME_SECONDS), len(rms) * vad.FRAME_SECONDS
+
+
+def _compute_regions(item: Tuple[str, str]) -> Tuple[np.ndarray, float]:
+	return compute_regions(item[1])
+
+
+def index_recordings(directory: str, result: VadIndexResult, processes=None):
+	full_paths = get_files_to_index(directory, result)
+	if not full_paths:
+		print("No files to index")
+		return
+
+	for (uuid, full_path), computed, error in audio_features.process_map(
+		_compute_regions, full_paths, processes
+	):
+		if error:
+			print(f"Error finding voice activity in {full_path}: {error}")
+			result.num_errored += 1
+			continue
+		regions, seconds = computed
+		with connect_to_db() as cur:
+			cur.execute(
+				"UPDATE recording SET active_regions = %s WHERE uuid = %s",
+				(vad.to_bytes(regions), uuid),
+			)
+		if cur.rowcount < 1:
+			print(f"That is odd: {uuid} not found in database")
+			continue
+		result.num_indexed += 1
+		result.total_seconds += seconds
+		result.active_seconds += vad.active_seconds(regions)
+
+
+def main():
+	root_directory = "/work/projects/tracker/mic/auto-sync"
+	result = VadIndexResult(root_directory=root_directory)
+	index_recordings(root_directory, result)
+	print(f"result: {result}")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,84 @@
+import os
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+import waveform
+from jobs import audio_features
+from jobs.utils import connect_to_db
+
+OUTPUT_DIRECTORY = "./outputs/waveforms"
+
+
+@dataclass
+class WaveformResult:
+	root_directory: str
+	num_computed: int = field(default=0)
+	num_skipped: int = field(default=0)
+	num_errored: int = field(default=0)
+
+
+def get_files_to_process(directory: str, output_directory: str, result: WaveformResult):
+	with connect_to_db() as cur:
+		cur.execute("SELECT uuid, file_path FROM recording")
+		rows = cur.fetchall()
+
+	full_paths = []
+	for row in rows:
+		uuid, file_path = str(row[0]), row[1]
+		if all(
+			os.path.exists(waveform.level_path(output_directory, uuid, name))
+			for name in waveform.RESOLUTIONS
+		):
+			continue
+		full_path = os.path.join(directory, file_path)
+		if not os.path.exists(full_path):
+			result.num_skipped += 1
+			continue
+		full_paths.append((uuid, full_path))
+	print(f"Computing waveforms for {len(full_paths)} of {len(rows)} recordings")
+	return full_paths
+
+
+def compute_levels(full_path: str) -> Dict[str, np.ndarray]:
+	step = waveform.RESOLUTIONS[waveform.FINEST]
+	finest = audio_features.compute_features(full_path, step)
+	return waveform.pyramid(finest[:, [audio_features.RMS, audio_features.PEAK]])
+
+
+def compute_waveforms(
+	directory: str,
+	output_directory: str,
+	result: WaveformResult,
+	processes: Optional[int] = None,
+):
+	full_paths = get_files_to_process(directory, output_directory, result)
+	if not full_paths:
+		print("No waveforms to compute")
+		return
+
+	for (uuid, full_path), levels, error in audio_features.process_map(
+		_compute_levels, full_paths, processes
+	):
+		if error:
+			print(f"Error computing waveform for {full_path}: {error}")
+			result.num_errored += 1
+			continue
+		waveform.save(output_directory, uuid, levels)
+		result.num_computed += 1
+
+
+def _compute_levels(item: Tuple[str, str]) -> Dict[str, np.ndarray]:
+	return compute_levels(item[1])
+
+
+def main():
+	root_directory = "/work/projects/tracker/mic/auto-sync"
+	result = WaveformResult(root_directory=root_directory)
+	compute_waveforms(root_directory, OUTPUT_DIRECTORY, result)
+	print(f"result: {result}")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,250 @@
+import bisect
+import io
+import struct
+import zlib
+from array import array
+from dataclasses import dataclass, field
+from typing import BinaryIO, Iterator, Optional, Tuple
+
+# capture pattern, version, header type, granule position, serial number,
+# page sequence number, crc, number of segments
+PAGE_HEADER = struct.Struct("<4sBBqIIIB")
+CRC_OFFSET = 22
+
+CONTINUED_PACKET = 0x01
+END_OF_STREAM = 0x04
+
+# opus granule positions always count 48kHz samples
+OPUS_SAMPLE_RATE = 48000
+# decoder convergence the opus spec recommends before the audio you want
+OPUS_PREROLL = 80 * OPUS_SAMPLE_RATE // 1000
+
+INDEX_MAGIC = b"OGI1"
+INDEX_HEADER = struct.Struct("<4sHHIQQI")
+
+
+@dataclass
+class Page:
+	offset: int
+	header_type: int
+	granule: int
+	serial: int
+	sequence: int
+	data: bytes
+
+	@property
+	def body(self) -> bytes:
+		return self.data[PAGE_HEADER.size + self.data[PAGE_HEADER.size - 1] :]
+
+
+def iter_pages(f: BinaryIO, offset: int = 0) -> Iterator[Page]:
+	f.seek(offset)
+	while True:
+		header = f.read(PAGE_HEADER.size)
+		if len(header) < PAGE_HEADER.size:
+			return
+		capture, _, header_type, granule, serial, sequence, _, num_segments = (
+			PAGE_HEADER.unpack(header)
+		)
+		if capture != b"OggS":
+			raise ValueError(f"No ogg page at offset {offset}")
+		segments = f.read(num_segments)
+		body = f.read(sum(segments))
+		data = header + segments + body
+		yield Page(offset, header_type, granule, serial, sequence, data)
+		offset += len(data)
+
+
+_REVERSED_BITS = bytes(int(f"{i:08b}"[::-1], 2) for i in range(256))
+
+
+def page_crc(data: bytes) -> int:
+	# ogg uses the unreflected crc32 with no initial value or final xor,
+	# which is zlib's crc32 with all the bits mirrored
+	crc = zlib.crc32(data.translate(_REVERSED_BITS), 0xFFFFFFFF) ^ 0xFFFFFFFF
+	return int(f"{crc:032b}"[::-1], 2)
+
+
+def rewrite_page(
+	page: Page, sequence: int, granule: int, header_type: Optional[int] = None
+) -> bytes:
+	data = bytearray(page.data)
+	struct.pack_into(
+		"<BqII",
+		data,
+		5,
+		page.header_type if header_type is None else header_type,
+		granule,
+		page.serial,
+		sequence,
+	)
+	struct.pack_into("<I", data, CRC_OFFSET, 0)
+	struct.pack_into("<I", data, CRC_OFFSET, page_crc(bytes(data)))
+	return bytes(data)
+
+
+@dataclass
+class OggIndex:
+	"""
+	Where the pages of an ogg opus file start, and the granule position
+	(48kHz samples including pre_skip) at the start of each one.
+
+	Only pages that begin with a fresh packet are listed, those are the
+	places a stream can be cut without leaving half a packet behind.
+	"""
+
+	pre_skip: int
+	header_pages: int
+	# the header pages are [0, header_end)
+	header_end: int
+	end_offset: int
+	end_granule: int
+	offsets: array = field(default_factory=lambda: array("q"))
+	granules: array = field(default_factory=lambda: array("q"))
+
+	@property
+	def duration(self) -> float:
+		return max(self.end_granule - self.pre_skip, 0) / OPUS_SAMPLE_RATE
+
+	def to_bytes(self) -> bytes:
+		# consecutive pages are close together, so the deltas fit in 32 bits
+		# and 2 hours of audio is a few tens of kilobytes
+		offsets = [
+			b - a for a, b in zip([self.header_end, *self.offsets], self.offsets)
+		]
+		granules = [b - a for a, b in zip([0, *self.granules], self.granules)]
+		count = len(self.offsets)
+		return (
+			INDEX_HEADER.pack(
+				INDEX_MAGIC,
+				self.pre_skip,
+				self.header_pages,
+				self.header_end,
+				self.end_offset,
+				self.end_granule,
+				count,
+			)
+			+ struct.pack(f"<{count}I", *offsets)
+			+ struct.pack(f"<{count}I", *granules)
+		)
+
+	@classmethod
+	def from_bytes(cls, data: bytes) -> "OggIndex":
+		magic, pre_skip, header_pages, header_end, end_offset, end_granule, count = (
+			INDEX_HEADER.unpack_from(data)
+		)
+		if magic != INDEX_MAGIC:
+			raise ValueError("Not an ogg index")
+		deltas = struct.unpack_from(f"<{2 * count}I", data, INDEX_HEADER.size)
+		index = cls(pre_skip, header_pages, header_end, end_offset, end_granule)
+		offset, granule = header_end, 0
+		for i in range(count):
+			offset += deltas[i]
+			granule += deltas[count + i]
+			index.offsets.append(offset)
+			index.granules.append(granule)
+		return index
+
+	def window(self, offset: float, duration: Optional[float]) -> Tuple[int, int, int]:
+		"""
+		The byte range [begin, end) of the pages covering the window and the
+		granule position the first of them starts at. A stream cut there
+		starts at max(granule - pre_skip, 0) / OPUS_SAMPLE_RATE seconds into
+		the recording, see iter_window().
+		"""
+		if not self.offsets:
+			return self.header_end, self.header_end, 0
+		# granules count pre_skip, offset and duration don't
+		target = max(self.pre_skip + int(offset * OPUS_SAMPLE_RATE) - OPUS_PREROLL, 0)
+		first = max(bisect.bisect_right(self.granules, target) - 1, 0)
+		last = len(self.offsets)
+		if duration is not None:
+			end = self.pre_skip + int((offset + duration) * OPUS_SAMPLE_RATE)
+			last = bisect.bisect_left(self.granules, end, lo=first + 1)
+		end_offset = self.offsets[last] if last < len(self.offsets) else self.end_offset
+		return self.offsets[first], end_offset, self.granules[first]
+
+
+def build_index(f: BinaryIO) -> OggIndex:
+	pages = iter_pages(f)
+	first = next(pages, None)
+	if not first or not first.body.startswith(b"OpusHead"):
+		raise ValueError("Not an ogg opus stream")
+	(pre_skip,) = struct.unpack_from("<H", first.body, 10)
+
+	index = OggIndex(
+		pre_skip=pre_skip,
+		header_pages=1,
+		header_end=len(first.data),
+		end_offset=len(first.data),
+		end_granule=0,
+	)
+	in_header = True
+	granule = 0
+	for page in pages:
+		if page.serial != first.serial:
+			# chained or multiplexed streams are not something we record
+			break
+		index.end_offset = page.offset + len(page.data)
+		if in_header:
+			# OpusTags, on as many pages as it takes, all with granule 0
+			if page.granule == 0:
+				index.header_pages += 1
+				index.header_end = index.end_offset
+				continue
+			in_header = False
+		if not page.header_type & CONTINUED_PACKET:
+			index.offsets.append(page.offset)
+			index.granules.append(granule)
+		if page.granule != -1:
+			granule = page.granule
+	index.end_granule = granule
+	return index
+
+
+def iter_window(
+	f: BinaryIO, index: OggIndex, offset: float, duration: Optional[float]
+) -> Iterator[bytes]:
+	"""
+	A self contained ogg opus stream of the window, made of the original
+	packets. Granule positions and page sequence numbers are rewritten so it
+	starts at zero.
+
+	pre_skip is only encoder delay at the very start of the recording, a
+	window from further in has it set to 0 so none of its audio is skipped.
+	"""
+	begin, end, base = index.window(offset, duration)
+
+	f.seek(0)
+	header = f.read(index.header_end)
+	yield _without_pre_skip(header) if base else header
+
+	sequence = index.header_pages
+	previous = None
+	for page in iter_pages(f, begin):
+		if page.offset >= end:
+			break
+		if previous:
+			yield rewrite_page(previous, sequence, _shift(previous.granule, base))
+			sequence += 1
+		previous = page
+	if previous:
+		yield rewrite_page(
+			previous,
+			sequence,
+			_shift(previous.granule, base),
+			header_type=previous.header_type | END_OF_STREAM,
+		)
+
+
+def _without_pre_skip(header: bytes) -> bytes:
+	page = next(iter_pages(io.BytesIO(header)))
+	data = bytearray(page.data)
+	# the OpusHead pre_skip field
+	struct.pack_into("<H", data, len(data) - len(page.body) + 10, 0)
+	page.data = bytes(data)
+	return rewrite_page(page, page.sequence, page.granule) + header[len(data) :]
+
+
+def _shift(granule: int, base: int) -> int:
+	return granule if granule == -1 else granule - base
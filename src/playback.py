@@ -0,0 +1,140 @@
+import asyncio
+from typing import AsyncIterator, List, Optional
+
+from starlette.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+
+class PlaybackBusy(Exception):
+	pass
+
+
+class Playback:
+	"""A running ffmpeg process holding one of the pool's slots."""
+
+	def __init__(
+		self,
+		pool: "FfmpegPool",
+		proc: asyncio.subprocess.Process,
+	):
+		self.pool = pool
+		self.proc = proc
+		self.closed = False
+
+	async def read(self) -> AsyncIterator[bytes]:
+		read_size = self.pool.min_read_size
+		try:
+			while True:
+				chunk = await self.proc.stdout.read(read_size)
+				if not chunk:
+					break
+				yield chunk
+				# bigger reads while ffmpeg keeps the pipe full, smaller when
+				# it can't keep up, so the first bytes still go out quickly
+				if len(chunk) >= read_size:
+					read_size = min(read_size * 2, self.pool.max_read_size)
+				else:
+					read_size = max(read_size // 2, self.pool.min_read_size)
+			await self.proc.wait()
+		finally:
+			await self.close()
+
+	async def close(self) -> None:
+		if self.closed:
+			return
+		self.closed = True
+		try:
+			if self.proc.returncode is None:
+				self.proc.kill()
+				await self.proc.wait()
+		finally:
+			self.pool._release()
+
+
+class FfmpegPool:
+	"""
+	Caps the number of ffmpeg processes.
+
+	Requests over the cap wait in line for a slot. Once the line is full, or
+	a request waited longer than wait_timeout, PlaybackBusy is raised so the
+	caller can turn it into a 503 instead of forking another process.
+	"""
+
+	def __init__(
+		self,
+		max_processes: int,
+		max_waiting: int,
+		wait_timeout: float,
+		min_read_size: int = 16 * 1024,
+		max_read_size: int = 256 * 1024,
+	):
+		self.max_processes = max_processes
+		self.max_waiting = max_waiting
+		self.wait_timeout = wait_timeout
+		self.min_read_size = min_read_size
+		self.max_read_size = max_read_size
+		self.running = 0
+		self.waiting = 0
+		self._slots = asyncio.Semaphore(max_processes)
+
+	async def _acquire(self, wait_timeout: Optional[float]) -> None:
+		if self.running + self.waiting >= self.max_processes + self.max_waiting:
+			raise PlaybackBusy("Too many playback requests waiting")
+		self.waiting += 1
+		try:
+			await asyncio.wait_for(self._slots.acquire(), wait_timeout)
+		except asyncio.TimeoutError:
+			raise PlaybackBusy("Timed out waiting for an ffmpeg slot")
+		finally:
+			self.waiting -= 1
+		self.running += 1
+
+	def _release(self) -> None:
+		self.running -= 1
+		self._slots.release()
+
+	async def start(
+		self, cmd: List[str], wait_timeout: Optional[float] = None
+	) -> Playback:
+		await self._acquire(self.wait_timeout if wait_timeout is None else wait_timeout)
+		try:
+			proc = await asyncio.create_subprocess_exec(
+				*cmd,
+				stdin=asyncio.subprocess.DEVNULL,
+				stdout=asyncio.subprocess.PIPE,
+				stderr=asyncio.subprocess.DEVNULL,
+			)
+		except BaseException:
+			self._release()
+			raise
+		return Playback(self, proc)
+
+
+class ClosingStreamingResponse(StreamingResponse):
+	"""
+	Closes the body iterator once the response is over. Starlette leaves it
+	to the garbage collector when the client goes away, and until then the
+	generators behind it keep their files and ffmpeg pipes open.
+	"""
+
+	async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+		try:
+			await super().__call__(scope, receive, send)
+		finally:
+			aclose = getattr(self.body_iterator, "aclose", None)
+			if aclose:
+				await aclose()
+
+
+class PlaybackResponse(ClosingStreamingResponse):
+	"""Streams a Playback and always closes it, even if nothing was sent."""
+
+	def __init__(self, playback: Playback, media_type: str = "audio/mpeg", **kwargs):
+		super().__init__(playback.read(), media_type=media_type, **kwargs)
+		self.playback = playback
+
+	async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+		try:
+			await super().__call__(scope, receive, send)
+		finally:
+			await self.playback.close()
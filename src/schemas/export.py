@@ -7,6 +7,8 @@ from pydantic import BaseModel, ConfigDict, Field
 
 
 class Recording(BaseModel):
+	model_config = ConfigDict(ser_json_timedelta="float")
+
 	uuid: uuid.UUID
 	file_path: str
 	begin_date: datetime.datetime
@@ -1,7 +1,9 @@
 import datetime
 from typing import Optional
 
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, Field
+
+from schemas.export import Recording
 
 
 class RecordingsSummary(BaseModel):
@@ -14,3 +16,19 @@ class RecordingsSummary(BaseModel):
 	total_disk_usage: Optional[int]
 
 	# could have the last recording end date
+
+
+class RecordingsBucket(BaseModel):
+	model_config = ConfigDict(ser_json_timedelta="float")
+
+	# recordings are counted in the bucket they begin in
+	bucket_start: datetime.datetime
+	number_of_recordings: int
+	sum_of_durations: datetime.timedelta
+	total_disk_usage: int
+
+
+class RecordingsPage(BaseModel):
+	recordings: list[Recording] = Field(default_factory=list)
+	# pass back as `after` to get the next page, None on the last page
+	next_cursor: Optional[str] = None
@@ -2,7 +2,7 @@ import datetime
 import uuid
 from typing import Literal, Optional
 
-from pydantic import BaseModel, ConfigDict, Field
+from pydantic import BaseModel, ConfigDict, Field, model_validator
 
 
 class PlayRecordingRequest(BaseModel):
@@ -11,6 +11,14 @@ class PlayRecordingRequest(BaseModel):
 	recording_id: uuid.UUID
 	offset: Optional[datetime.timedelta] = None
 	duration: Optional[datetime.timedelta] = None
+	# opus is the original packets, without re-encoding
+	format: Literal["mp3", "opus"] = "mp3"
+
+
+class PlayRangeRequest(BaseModel):
+	# wall clock, may span several recordings, gaps are played as silence
+	start: datetime.datetime
+	end: datetime.datetime
 
 
 class SearchPrompt(BaseModel):
@@ -28,6 +36,35 @@ class SearchUpdate(BaseModel):
 	created_at: datetime.datetime = Field(default_factory=datetime.datetime.now)
 
 
+class MultiSearchPrompt(BaseModel):
+	# sorted by prompt_timestamp
+	prompts: list[SearchPrompt]
+	created_at: datetime.datetime = Field(default_factory=datetime.datetime.now)
+
+	current_lower_bound: Optional[datetime.datetime] = None
+	current_upper_bound: Optional[datetime.datetime] = None
+
+
+class MultiSearchUpdate(BaseModel):
+	prompts: list[SearchPrompt]
+	# the target is between prompts[interval - 1] and prompts[interval],
+	# 0 means before the first prompt and len(prompts) after the last one
+	interval: Optional[int] = None
+	# or the target was heard in prompts[exact]
+	exact: Optional[int] = None
+	created_at: datetime.datetime = Field(default_factory=datetime.datetime.now)
+
+	@model_validator(mode="after")
+	def check_vote(self) -> "MultiSearchUpdate":
+		if (self.interval is None) == (self.exact is None):
+			raise ValueError("Exactly one of interval or exact must be set")
+		if self.exact is not None and not 0 <= self.exact < len(self.prompts):
+			raise ValueError("exact must index into prompts")
+		if self.interval is not None and not 0 <= self.interval <= len(self.prompts):
+			raise ValueError("interval must be between 0 and len(prompts)")
+		return self
+
+
 class SearchListResult(BaseModel):
 	uuid: str = Field(default_factory=lambda: str(uuid.uuid4()))
 	search_status: Literal["active", "completed"]
@@ -44,6 +81,11 @@ class Search(BaseModel):
 	target_duration: Optional[datetime.timedelta] = None
 	original_lower_bound: Optional[datetime.datetime] = None
 	original_upper_bound: Optional[datetime.datetime] = None
+	# how many prompts GET /search/{id}/prompts hands out per round
+	prompts_per_round: int = Field(default=1, ge=1)
+	# narrowed by every update, so nobody has to go through updates again
+	current_lower_bound: Optional[datetime.datetime] = None
+	current_upper_bound: Optional[datetime.datetime] = None
 
 	updates: list[SearchUpdate] = Field(default_factory=list)
 
@@ -54,3 +96,13 @@ class CreateSearchRequest(BaseModel):
 	duration: Optional[datetime.timedelta] = None
 	lower: Optional[datetime.datetime] = None
 	upper: Optional[datetime.datetime] = None
+	prompts_per_round: int = Field(default=1, ge=1, le=16)
+
+
+class SearchSessionMessage(BaseModel):
+	# what the server sends over /search/{id}/session, exactly one is set.
+	# prompts is followed by the audio of each prompt as binary frames,
+	# each prompt's audio ending with an empty frame
+	prompts: Optional[MultiSearchPrompt] = None
+	search: Optional[Search] = None
+	error: Optional[str] = None
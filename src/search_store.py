@@ -0,0 +1,232 @@
+import abc
+import datetime
+import uuid
+from typing import Callable, Dict, List, Optional
+
+import asyncpg
+
+import schemas.searches as searches
+from common import normalize_datetime
+
+SearchChange = Callable[[searches.Search], None]
+
+
+def apply_update(search: searches.Search, update: searches.SearchUpdate) -> None:
+	"""Record update and move the current bounds and status along with it."""
+	search.updates.append(update)
+	timestamp = normalize_datetime(update.prompt.prompt_timestamp)
+	if update.result == "after":
+		if not search.current_lower_bound or timestamp > search.current_lower_bound:
+			search.current_lower_bound = timestamp
+	elif update.result == "before":
+		if not search.current_upper_bound or timestamp < search.current_upper_bound:
+			search.current_upper_bound = timestamp
+	# whatever was said last decides, same as looking at the latest update
+	search.search_status = "completed" if update.result == "exact" else "active"
+	search.updated_at = datetime.datetime.now()
+
+
+def apply_vote(search: searches.Search, vote: searches.MultiSearchUpdate) -> None:
+	prompts = sorted(vote.prompts, key=lambda x: x.prompt_timestamp)
+	# record the vote as the binary updates it implies, the bounds
+	# only ever move to the neighbouring prompts anyway
+	if vote.exact is not None:
+		apply_update(
+			search,
+			searches.SearchUpdate(
+				prompt=prompts[vote.exact],
+				result="exact",
+				created_at=vote.created_at,
+			),
+		)
+		return
+	if vote.interval > 0:
+		apply_update(
+			search,
+			searches.SearchUpdate(
+				prompt=prompts[vote.interval - 1],
+				result="after",
+				created_at=vote.created_at,
+			),
+		)
+	if vote.interval < len(prompts):
+		apply_update(
+			search,
+			searches.SearchUpdate(
+				prompt=prompts[vote.interval],
+				result="before",
+				created_at=vote.created_at,
+			),
+		)
+
+
+class SearchStore(abc.ABC):
+	"""Where searches live between requests."""
+
+	@abc.abstractmethod
+	async def create(self, search: searches.Search) -> None: ...
+
+	@abc.abstractmethod
+	async def get(self, search_id: str) -> Optional[searches.Search]: ...
+
+	@abc.abstractmethod
+	async def update(
+		self, search_id: str, change: SearchChange
+	) -> Optional[searches.Search]:
+		"""
+		Apply change to the search and save it, without another request
+		changing it in between. None if there is no such search.
+		"""
+
+	@abc.abstractmethod
+	async def list(self, status: Optional[str] = None) -> List[searches.Search]: ...
+
+	@abc.abstractmethod
+	async def evict(
+		self, completed_ttl: datetime.timedelta, idle_ttl: datetime.timedelta
+	) -> int:
+		"""
+		Drop searches completed more than completed_ttl ago, and active ones
+		nobody touched in idle_ttl. Returns how many were dropped.
+		"""
+
+
+class InMemorySearchStore(SearchStore):
+	"""Only visible to the worker that holds it, gone on restart."""
+
+	def __init__(self):
+		self._searches: Dict[str, searches.Search] = {}
+
+	async def create(self, search: searches.Search) -> None:
+		self._searches[search.uuid] = search
+
+	async def get(self, search_id: str) -> Optional[searches.Search]:
+		return self._searches.get(search_id)
+
+	async def update(
+		self, search_id: str, change: SearchChange
+	) -> Optional[searches.Search]:
+		# nothing awaits in between, so this is atomic within the event loop
+		search = self._searches.get(search_id)
+		if search:
+			change(search)
+		return search
+
+	async def list(self, status: Optional[str] = None) -> List[searches.Search]:
+		return [
+			s
+			for s in self._searches.values()
+			if not status or s.search_status == status
+		]
+
+	async def evict(
+		self, completed_ttl: datetime.timedelta, idle_ttl: datetime.timedelta
+	) -> int:
+		now = datetime.datetime.now()
+		expired = [
+			s.uuid
+			for s in self._searches.values()
+			if now - s.updated_at > idle_ttl
+			or (s.search_status == "completed" and now - s.updated_at > completed_ttl)
+		]
+		for search_id in expired:
+			del self._searches[search_id]
+		return len(expired)
+
+
+def _parse_id(search_id: str) -> Optional[uuid.UUID]:
+	try:
+		return uuid.UUID(search_id)
+	except ValueError:
+		return None
+
+
+class PostgresSearchStore(SearchStore):
+	"""
+	Searches as JSON in the search table, shared by every worker.
+
+	Status and the timestamps are columns too so listing and eviction
+	don't have to look inside the JSON.
+	"""
+
+	def __init__(self, pool: asyncpg.Pool):
+		self.pool = pool
+
+	async def create(self, search: searches.Search) -> None:
+		async with self.pool.acquire() as conn:
+			await conn.execute(
+				"""
+				INSERT INTO search (uuid, search_status, created_at, updated_at, data)
+				VALUES ($1, $2, now(), now(), $3::jsonb)
+				""",
+				uuid.UUID(search.uuid),
+				search.search_status,
+				search.model_dump_json(),
+			)
+
+	async def get(self, search_id: str) -> Optional[searches.Search]:
+		search_uuid = _parse_id(search_id)
+		if not search_uuid:
+			return None
+		async with self.pool.acquire() as conn:
+			data = await conn.fetchval(
+				"SELECT data FROM search WHERE uuid = $1", search_uuid
+			)
+		return searches.Search.model_validate_json(data) if data else None
+
+	async def update(
+		self, search_id: str, change: SearchChange
+	) -> Optional[searches.Search]:
+		search_uuid = _parse_id(search_id)
+		if not search_uuid:
+			return None
+		async with self.pool.acquire() as conn:
+			async with conn.transaction():
+				# the row lock keeps two workers from both applying an
+				# update on top of the same old state
+				data = await conn.fetchval(
+					"SELECT data FROM search WHERE uuid = $1 FOR UPDATE",
+					search_uuid,
+				)
+				if not data:
+					return None
+				search = searches.Search.model_validate_json(data)
+				change(search)
+				await conn.execute(
+					"""
+					UPDATE search
+					SET search_status = $2, updated_at = now(), data = $3::jsonb
+					WHERE uuid = $1
+					""",
+					search_uuid,
+					search.search_status,
+					search.model_dump_json(),
+				)
+		return search
+
+	async def list(self, status: Optional[str] = None) -> List[searches.Search]:
+		async with self.pool.acquire() as conn:
+			if status:
+				rows = await conn.fetch(
+					"SELECT data FROM search WHERE search_status = $1 ORDER BY created_at",
+					status,
+				)
+			else:
+				rows = await conn.fetch("SELECT data FROM search ORDER BY created_at")
+		return [searches.Search.model_validate_json(row["data"]) for row in rows]
+
+	async def evict(
+		self, completed_ttl: datetime.timedelta, idle_ttl: datetime.timedelta
+	) -> int:
+		async with self.pool.acquire() as conn:
+			status = await conn.execute(
+				"""
+				DELETE FROM search
+				WHERE (search_status = 'completed' AND updated_at < now() - $1::interval)
+				OR updated_at < now() - $2::interval
+				""",
+				completed_ttl,
+				idle_ttl,
+			)
+		# "DELETE <count>"
+		return int(status.split()[-1])
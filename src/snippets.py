@@ -0,0 +1,229 @@
+import asyncio
+import collections
+import hashlib
+import os
+import time
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+import schemas.searches as searches
+
+# a temp file this old is left over even if its pid was reused
+STALE_TEMP_SECONDS = 60 * 60
+
+
+class SnippetFailed(Exception):
+	pass
+
+
+def snippet_key(
+	content_id: str,
+	play_request: searches.PlayRecordingRequest,
+	output_format: str,
+) -> str:
+	# rounded so a request that went through json and back still matches
+	def seconds(delta):
+		return round(delta.total_seconds(), 3) if delta is not None else None
+
+	return ":".join(
+		[
+			content_id,
+			str(seconds(play_request.offset)),
+			str(seconds(play_request.duration)),
+			output_format,
+		]
+	)
+
+
+class Snippet:
+	"""Encoded audio that can be streamed while it is still being encoded."""
+
+	def __init__(self):
+		self.chunks: List[bytes] = []
+		self.size = 0
+		self.done = False
+		self.failed = False
+		self._changed = asyncio.Condition()
+
+	async def append(self, chunk: bytes) -> None:
+		async with self._changed:
+			self.chunks.append(chunk)
+			self.size += len(chunk)
+			self._changed.notify_all()
+
+	async def finish(self, failed: bool = False) -> None:
+		async with self._changed:
+			self.done = True
+			self.failed = failed
+			self._changed.notify_all()
+
+	async def read(self) -> AsyncIterator[bytes]:
+		idx = 0
+		while True:
+			async with self._changed:
+				await self._changed.wait_for(
+					lambda: idx < len(self.chunks) or self.done
+				)
+				chunks = self.chunks[idx:]
+				done = self.done
+			for chunk in chunks:
+				yield chunk
+			idx += len(chunks)
+			if done and idx >= len(self.chunks):
+				if self.failed:
+					# whatever was sent is cut short, the response can't succeed
+					raise SnippetFailed("Encoding the snippet failed")
+				return
+
+
+class SnippetCache:
+	"""
+	Encoded snippets on disk, evicted least recently used first once they
+	take up more than max_bytes.
+
+	A snippet being encoded is kept in memory until it is written out, so
+	concurrent requests for the same key share one encode and stream it as
+	it is produced.
+	Several workers can share the directory, each one only tracks the size
+	of the files it has seen so the cap is approximate.
+	"""
+
+	def __init__(self, directory: str, max_bytes: int):
+		self.directory = directory
+		self.max_bytes = max_bytes
+		self.total_bytes = 0
+		self._entries: collections.OrderedDict[str, int] = collections.OrderedDict()
+		self._in_flight: Dict[str, Snippet] = {}
+
+	def load(self) -> None:
+		os.makedirs(self.directory, exist_ok=True)
+		files = []
+		for entry in os.scandir(self.directory):
+			if entry.name.endswith(".tmp"):
+				if _is_stale(entry):
+					# left behind by an encode that never finished
+					try:
+						os.unlink(entry.path)
+					except FileNotFoundError:
+						pass
+				continue
+			stat = entry.stat()
+			files.append((stat.st_mtime, entry.name, stat.st_size))
+		self._entries.clear()
+		self.total_bytes = 0
+		for _, name, size in sorted(files):
+			self._entries[name] = size
+			self.total_bytes += size
+		self._evict()
+
+	def _filename(self, key: str) -> str:
+		output_format = key.rsplit(":", 1)[-1]
+		return hashlib.sha256(key.encode()).hexdigest() + "." + output_format
+
+	def _temp_path(self, key: str) -> str:
+		return os.path.join(self.directory, f"{self._filename(key)}.{os.getpid()}.tmp")
+
+	def get(self, key: str) -> Optional[str]:
+		"""Path of the finished snippet for key, if there is one."""
+		name = self._filename(key)
+		path = os.path.join(self.directory, name)
+		if name not in self._entries:
+			if not os.path.exists(path):
+				return None
+			# written by another worker
+			self._add(name, os.path.getsize(path))
+			return path
+		try:
+			# the mtime is the recency that survives a restart
+			os.utime(path)
+		except FileNotFoundError:
+			# evicted by another worker
+			self.total_bytes -= self._entries.pop(name)
+			return None
+		self._entries.move_to_end(name)
+		return path
+
+	def in_flight(self, key: str) -> Optional[Snippet]:
+		return self._in_flight.get(key)
+
+	def start(self, key: str) -> Tuple[Snippet, bool]:
+		"""The snippet for key, and whether the caller has to encode it."""
+		snippet = self._in_flight.get(key)
+		if snippet:
+			return snippet, False
+		snippet = Snippet()
+		self._in_flight[key] = snippet
+		return snippet, True
+
+	async def write(self, key: str, chunks: AsyncIterator[bytes]) -> None:
+		# kept in memory while it is encoded, finish() writes it out
+		snippet = self._in_flight[key]
+		async for chunk in chunks:
+			await snippet.append(chunk)
+
+	async def finish(self, key: str, ok: bool) -> None:
+		snippet = self._in_flight[key]
+		try:
+			if ok:
+				name = self._filename(key)
+				# off the event loop, a snippet can be a few megabytes
+				if await asyncio.to_thread(self._store, key, list(snippet.chunks)):
+					self._add(name, snippet.size)
+					self._evict()
+		finally:
+			# only once it is on disk, so nobody starts encoding it again
+			self._in_flight.pop(key)
+			await snippet.finish(failed=not ok)
+
+	def _store(self, key: str, chunks: List[bytes]) -> bool:
+		temp_path = self._temp_path(key)
+		try:
+			with open(temp_path, "wb") as f:
+				f.writelines(chunks)
+			os.replace(temp_path, os.path.join(self.directory, self._filename(key)))
+			return True
+		except FileNotFoundError:
+			# the directory was cleared under us, the snippet just isn't cached
+			return False
+		except OSError as e:
+			print(f"Error caching snippet {key}: {e}")
+			try:
+				os.unlink(temp_path)
+			except FileNotFoundError:
+				pass
+			return False
+
+	def _add(self, name: str, size: int) -> None:
+		if name in self._entries:
+			self.total_bytes -= self._entries[name]
+		self._entries[name] = size
+		self._entries.move_to_end(name)
+		self.total_bytes += size
+
+	def _evict(self) -> None:
+		while self.total_bytes > self.max_bytes and self._entries:
+			name, size = self._entries.popitem(last=False)
+			self.total_bytes -= size
+			try:
+				os.unlink(os.path.join(self.directory, name))
+			except FileNotFoundError:
+				pass
+
+
+def _is_stale(entry: os.DirEntry) -> bool:
+	# <name>.<pid>.tmp, a live pid is another worker still encoding
+	try:
+		if time.time() - entry.stat().st_mtime > STALE_TEMP_SECONDS:
+			return True
+		pid = int(entry.name.rsplit(".", 2)[-2])
+	except (FileNotFoundError, ValueError):
+		return True
+	if pid <= 0 or pid == os.getpid():
+		return True
+	try:
+		os.kill(pid, 0)
+	except ProcessLookupError:
+		return True
+	except PermissionError:
+		# someone else's process, but alive
+		return False
+	return False
@@ -0,0 +1,349 @@
+import bisect
+import datetime
+from array import array
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import asyncpg
+
+from common import normalize_datetime
+
+VERSION_QUERY = "SELECT version, deleted_version FROM catalog_version"
+
+TIMELINE_QUERY = """
+	SELECT
+		uuid, file_path, begin_date, audio_length, disk_usage, sha256sum,
+		imported_at, updated_at
+	FROM recording
+"""
+
+
+@dataclass
+class Interval:
+	uuid: str
+	file_path: str
+	begin: datetime.datetime
+	end: datetime.datetime
+	disk_usage: Optional[int] = None
+	# filled in later by the checksum job, picked up by refresh through
+	# updated_at
+	sha256sum: Optional[str] = None
+
+	@property
+	def audio_length(self) -> datetime.timedelta:
+		return self.end - self.begin
+
+
+def _to_seconds(dt: datetime.datetime) -> float:
+	return normalize_datetime(dt).timestamp()
+
+
+def _to_datetime(seconds: float) -> datetime.datetime:
+	return datetime.datetime.fromtimestamp(seconds, tz=datetime.timezone.utc)
+
+
+class RecordingTimeline:
+	"""
+	Every recording as a [begin, end) interval, sorted by begin date.
+
+	The begin/end times live in flat arrays so lookups are a bisect away
+	instead of a round trip to postgres.
+	"""
+
+	def __init__(self):
+		self._clear()
+		# catalog version from before the last load or refresh, the timeline
+		# is at least this fresh
+		self.version: Optional[int] = None
+
+	def _clear(self) -> None:
+		self._begins = array("d")
+		self._ends = array("d")
+		self._intervals: List[Interval] = []
+		self._by_uuid: Dict[str, Interval] = {}
+		# longest recording, bounds how far back an overlapping one can start
+		self._max_length = 0.0
+		self._last_end: Optional[float] = None
+		self._total_length = 0.0
+		self._total_disk_usage = 0
+		# newest imported_at and updated_at seen, refresh only asks for rows
+		# after them
+		self._watermark: Optional[datetime.datetime] = None
+		self._updated_watermark: Optional[datetime.datetime] = None
+		# union of all intervals plus the recorded seconds before each one,
+		# built lazily and thrown away whenever a recording is added
+		self._coverage: Optional[Tuple[array, array, array]] = None
+
+	def __len__(self) -> int:
+		return len(self._intervals)
+
+	def get(self, uuid: str) -> Optional[Interval]:
+		return self._by_uuid.get(str(uuid))
+
+	def add(
+		self,
+		uuid: str,
+		file_path: str,
+		begin_date: datetime.datetime,
+		audio_length: datetime.timedelta,
+		disk_usage: Optional[int] = None,
+		sha256sum: Optional[str] = None,
+	) -> None:
+		uuid = str(uuid)
+		if uuid in self._by_uuid:
+			return
+		begin = _to_seconds(begin_date)
+		end = begin + audio_length.total_seconds()
+		interval = Interval(
+			uuid=uuid,
+			file_path=file_path,
+			begin=_to_datetime(begin),
+			end=_to_datetime(end),
+			disk_usage=disk_usage,
+			sha256sum=sha256sum,
+		)
+		# rows mostly arrive in begin order, so this is usually an append
+		idx = bisect.bisect_right(self._begins, begin)
+		self._begins.insert(idx, begin)
+		self._ends.insert(idx, end)
+		self._intervals.insert(idx, interval)
+		self._by_uuid[uuid] = interval
+		self._max_length = max(self._max_length, end - begin)
+		self._last_end = end if self._last_end is None else max(self._last_end, end)
+		self._total_length += end - begin
+		self._total_disk_usage += disk_usage or 0
+		self._coverage = None
+
+	def remove(self, uuid: str) -> None:
+		interval = self._by_uuid.pop(str(uuid), None)
+		if interval is None:
+			return
+		begin = _to_seconds(interval.begin)
+		end = _to_seconds(interval.end)
+		# begins can repeat, find this very interval among its neighbours
+		idx = bisect.bisect_left(self._begins, begin - 1e-3)
+		while self._intervals[idx] is not interval:
+			idx += 1
+		del self._begins[idx]
+		del self._ends[idx]
+		del self._intervals[idx]
+		# _max_length stays as it is, it only has to be an upper bound
+		if self._last_end is not None and end >= self._last_end:
+			self._last_end = max(self._ends) if self._ends else None
+		self._total_length -= end - begin
+		self._total_disk_usage -= interval.disk_usage or 0
+		self._coverage = None
+
+	def _add_rows(self, rows) -> None:
+		for row in rows:
+			if row["updated_at"] and (
+				not self._updated_watermark
+				or row["updated_at"] > self._updated_watermark
+			):
+				self._updated_watermark = row["updated_at"]
+			if not row["begin_date"] or row["audio_length"] is None:
+				continue
+			self.add(
+				row["uuid"],
+				row["file_path"],
+				row["begin_date"],
+				row["audio_length"],
+				row["disk_usage"],
+				row["sha256sum"],
+			)
+			if row["imported_at"] and (
+				not self._watermark or row["imported_at"] > self._watermark
+			):
+				self._watermark = row["imported_at"]
+
+	async def load(self, pool: asyncpg.Pool) -> None:
+		async with pool.acquire() as conn:
+			version = await conn.fetchval(VERSION_QUERY)
+			rows = await conn.fetch(TIMELINE_QUERY + " ORDER BY begin_date")
+		self._clear()
+		self._add_rows(rows)
+		self.version = version
+
+	async def refresh(self, pool: asyncpg.Pool) -> None:
+		if self._watermark is None:
+			await self.load(pool)
+			return
+		# >= because rows committed in the same transaction share imported_at,
+		# add() skips the ones we already have
+		async with pool.acquire() as conn:
+			version, deleted_version = await conn.fetchrow(VERSION_QUERY)
+			if version == self.version:
+				return
+			if deleted_version > self.version:
+				rows = None
+			else:
+				rows = await conn.fetch(
+					TIMELINE_QUERY
+					+ """
+					WHERE imported_at >= $1
+					OR updated_at >= COALESCE($2, '-infinity'::timestamptz)
+					ORDER BY begin_date
+					""",
+					self._watermark,
+					self._updated_watermark,
+				)
+		if rows is None:
+			# a deleted row leaves nothing to fetch, cheaper to start over than
+			# to diff
+			await self.load(pool)
+			return
+		for row in rows:
+			# updated since we saw it, add() below puts the new values back
+			if row["updated_at"]:
+				self.remove(row["uuid"])
+		self._add_rows(rows)
+		self.version = version
+
+	def covering(self, timestamp: datetime.datetime) -> Optional[Interval]:
+		t = _to_seconds(timestamp)
+		idx = bisect.bisect_right(self._begins, t) - 1
+		# sources can overlap, so walk back as far as the longest recording
+		while idx >= 0 and self._begins[idx] >= t - self._max_length:
+			if self._ends[idx] > t:
+				return self._intervals[idx]
+			idx -= 1
+		return None
+
+	def latest_before(self, timestamp: datetime.datetime) -> Optional[Interval]:
+		idx = bisect.bisect_left(self._begins, _to_seconds(timestamp)) - 1
+		if idx < 0:
+			return None
+		return self._intervals[idx]
+
+	def first_begin(self) -> Optional[datetime.datetime]:
+		if not self._begins:
+			return None
+		return _to_datetime(self._begins[0])
+
+	def last_begin(self) -> Optional[datetime.datetime]:
+		if not self._begins:
+			return None
+		return _to_datetime(self._begins[-1])
+
+	def last_end(self) -> Optional[datetime.datetime]:
+		if self._last_end is None:
+			return None
+		return _to_datetime(self._last_end)
+
+	def gaps(
+		self,
+		start: datetime.datetime,
+		end: datetime.datetime,
+		min_gap: datetime.timedelta = datetime.timedelta(0),
+	) -> List[Tuple[datetime.datetime, datetime.datetime]]:
+		lo, hi = _to_seconds(start), _to_seconds(end)
+		ret = []
+		cursor = lo
+		idx = max(bisect.bisect_right(self._begins, lo - self._max_length) - 1, 0)
+		for i in range(idx, len(self._begins)):
+			begin = self._begins[i]
+			if begin >= hi:
+				break
+			if begin > cursor and begin - cursor > min_gap.total_seconds():
+				ret.append((_to_datetime(cursor), _to_datetime(begin)))
+			cursor = max(cursor, self._ends[i])
+		if hi > cursor and hi - cursor > min_gap.total_seconds():
+			ret.append((_to_datetime(cursor), _to_datetime(hi)))
+		return ret
+
+	def pieces(
+		self, start: datetime.datetime, end: datetime.datetime
+	) -> List[Tuple[Optional[Interval], datetime.datetime, datetime.datetime]]:
+		"""
+		[start, end) cut into consecutive pieces, each either covered by a
+		recording or a gap (None). Where sources overlap the one that
+		started first wins.
+		"""
+		lo, hi = _to_seconds(start), _to_seconds(end)
+		ret = []
+		cursor = lo
+		idx = max(bisect.bisect_right(self._begins, lo - self._max_length) - 1, 0)
+		for i in range(idx, len(self._begins)):
+			begin, stop = self._begins[i], self._ends[i]
+			if begin >= hi:
+				break
+			if stop <= cursor:
+				continue
+			if begin > cursor:
+				ret.append((None, _to_datetime(cursor), _to_datetime(begin)))
+				cursor = begin
+			piece_end = min(stop, hi)
+			ret.append(
+				(self._intervals[i], _to_datetime(cursor), _to_datetime(piece_end))
+			)
+			cursor = piece_end
+		if cursor < hi:
+			ret.append((None, _to_datetime(cursor), _to_datetime(hi)))
+		return ret
+
+	def _get_coverage(self) -> Tuple[array, array, array]:
+		if self._coverage is not None:
+			return self._coverage
+		begins, ends, cumulative = array("d"), array("d"), array("d")
+		recorded = 0.0
+		for begin, end in zip(self._begins, self._ends):
+			if ends and begin <= ends[-1]:
+				if end > ends[-1]:
+					recorded += end - ends[-1]
+					ends[-1] = end
+				continue
+			begins.append(begin)
+			ends.append(end)
+			cumulative.append(recorded)
+			recorded += end - begin
+		self._coverage = (begins, ends, cumulative)
+		return self._coverage
+
+	def recorded_seconds(self, timestamp: datetime.datetime) -> float:
+		"""Seconds of audio recorded before timestamp, gaps count for nothing."""
+		begins, ends, cumulative = self._get_coverage()
+		t = _to_seconds(timestamp)
+		idx = bisect.bisect_right(begins, t) - 1
+		if idx < 0:
+			return 0.0
+		return cumulative[idx] + min(t, ends[idx]) - begins[idx]
+
+	def at_recorded_seconds(self, seconds: float) -> Optional[datetime.datetime]:
+		"""Inverse of recorded_seconds, always lands inside a recording."""
+		begins, ends, cumulative = self._get_coverage()
+		if not begins:
+			return None
+		idx = max(bisect.bisect_right(cumulative, seconds) - 1, 0)
+		t = begins[idx] + max(seconds - cumulative[idx], 0.0)
+		# stay strictly inside [begin, end)
+		return _to_datetime(min(t, ends[idx] - 1e-3))
+
+	def recorded_quantiles(
+		self, lower: datetime.datetime, upper: datetime.datetime, k: int
+	) -> List[datetime.datetime]:
+		"""k points splitting [lower, upper] into k + 1 equal parts of audio."""
+		lo = self.recorded_seconds(lower)
+		hi = self.recorded_seconds(upper)
+		if hi <= lo:
+			# nothing recorded in between
+			return []
+		step = (hi - lo) / (k + 1)
+		return [self.at_recorded_seconds(lo + step * i) for i in range(1, k + 1)]
+
+	def recorded_midpoint(
+		self, lower: datetime.datetime, upper: datetime.datetime
+	) -> Optional[datetime.datetime]:
+		"""Halfway between lower and upper by recorded audio, not by wall time."""
+		quantiles = self.recorded_quantiles(lower, upper, 1)
+		return quantiles[0] if quantiles else None
+
+	def summary(self) -> dict:
+		return {
+			"number_of_recordings": len(self),
+			"sum_of_durations": datetime.timedelta(seconds=self._total_length)
+			if self._intervals
+			else None,
+			"first_recording_begin": self.first_begin(),
+			"last_recording_begin": self.last_begin(),
+			"total_disk_usage": self._total_disk_usage if self._intervals else None,
+		}
@@ -0,0 +1,157 @@
+import struct
+from typing import List, Tuple, TypeVar
+
+import numpy as np
+
+# regions are (n, 2) uint32 milliseconds from the start of the recording,
+# [start, end), sorted and not overlapping
+
+# frame of audio_features the detector looks at
+FRAME_SECONDS = 0.03
+# a frame is active this far above the noise floor...
+MARGIN_DB = 12.0
+# ...and never below this, so a silent file stays silent
+MIN_THRESHOLD_DB = -50.0
+# quietest frames taken as the noise floor
+NOISE_PERCENTILE = 10
+# shorter bursts are clicks and bumps
+MIN_ACTIVE_SECONDS = 0.2
+# kept on both sides of every region, so words are not cut off
+HANGOVER_SECONDS = 0.3
+# regions closer than this are one region
+MERGE_GAP_SECONDS = 1.0
+
+HEADER = struct.Struct("<4sI")
+MAGIC = b"VAD1"
+
+T = TypeVar("T")
+
+
+def _to_db(rms: np.ndarray) -> np.ndarray:
+	return 20 * np.log10(np.maximum(rms, 1e-10))
+
+
+def detect(rms: np.ndarray, frame_seconds: float = FRAME_SECONDS) -> np.ndarray:
+	"""Active regions of a recording from the rms of its frames."""
+	if not len(rms):
+		return np.empty((0, 2), dtype=np.uint32)
+	level = _to_db(rms)
+	threshold = max(
+		np.percentile(level, NOISE_PERCENTILE) + MARGIN_DB, MIN_THRESHOLD_DB
+	)
+	edges = np.diff((level > threshold).astype(np.int8), prepend=0, append=0)
+	starts = np.flatnonzero(edges == 1) * frame_seconds
+	ends = np.flatnonzero(edges == -1) * frame_seconds
+
+	keep = ends - starts >= MIN_ACTIVE_SECONDS
+	starts, ends = starts[keep], ends[keep]
+	if not len(starts):
+		return np.empty((0, 2), dtype=np.uint32)
+
+	total = len(rms) * frame_seconds
+	starts = np.maximum(starts - HANGOVER_SECONDS, 0)
+	ends = np.minimum(ends + HANGOVER_SECONDS, total)
+	# padded regions that overlap or nearly touch are merged
+	breaks = np.flatnonzero(starts[1:] > ends[:-1] + MERGE_GAP_SECONDS)
+	starts = np.append(starts[0], starts[breaks + 1])
+	ends = np.append(ends[breaks], ends[-1])
+	return np.round(np.stack([starts, ends], axis=1) * 1000).astype(np.uint32)
+
+
+def to_bytes(regions: np.ndarray) -> bytes:
+	# 8 bytes a region, an hour of talk radio is a few kilobytes
+	regions = np.asarray(regions, dtype="<u4").reshape(-1, 2)
+	return HEADER.pack(MAGIC, len(regions)) + regions.tobytes()
+
+
+def from_bytes(data: bytes) -> np.ndarray:
+	magic, count = HEADER.unpack_from(data)
+	if magic != MAGIC:
+		raise ValueError(f"Not an active regions blob: {magic!r}")
+	return (
+		np.frombuffer(data, dtype="<u4", count=2 * count, offset=HEADER.size)
+		.reshape(count, 2)
+		.astype(np.uint32)
+	)
+
+
+def active_seconds(regions: np.ndarray) -> float:
+	return float(np.sum(regions[:, 1] - regions[:, 0], dtype=np.int64)) / 1000
+
+
+def clip(regions: np.ndarray, start: int, end: int) -> np.ndarray:
+	"""The regions within [start, end) milliseconds, relative to start."""
+	clipped = np.clip(regions.astype(np.int64), start, end) - start
+	return clipped[clipped[:, 1] > clipped[:, 0]].astype(np.uint32)
+
+
+def snap(regions: np.ndarray, offset: float, duration: float = 0.0) -> float:
+	"""
+	The offset, in seconds, moved as little as possible so that a snippet
+	of duration starting there has voice in it. Unchanged when there are no
+	regions.
+	"""
+	if not len(regions):
+		return offset
+	ms = offset * 1000
+	i = int(np.searchsorted(regions[:, 0], ms, side="right"))
+	# the region starting at or before the offset
+	if i and ms < regions[i - 1, 1]:
+		return offset
+	previous_end = regions[i - 1, 1] / 1000 if i else None
+	next_start = regions[i, 0] / 1000 if i < len(regions) else None
+	if next_start is not None and (
+		previous_end is None or next_start - offset <= offset - previous_end
+	):
+		return next_start
+	# so the snippet ends with the previous region rather than after it
+	return max(regions[i - 1, 0] / 1000, previous_end - duration)
+
+
+def keep_order(originals: List[T], snapped: List[T], lower: T, upper: T) -> List[T]:
+	"""
+	Points that were snapped one at a time, put back in order. originals
+	are increasing, each snapped point has to stay after the one before it
+	and before the next original, otherwise it goes back to its original.
+	Sorted and without duplicates, so there can be fewer of them.
+	"""
+	ret = []
+	previous = lower
+	for i, (original, point) in enumerate(zip(originals, snapped)):
+		following = originals[i + 1] if i + 1 < len(originals) else upper
+		if not previous < point < following:
+			point = original
+		ret.append(point)
+		previous = point
+	return sorted(set(ret))
+
+
+def gather(
+	samples: np.ndarray, regions: np.ndarray, sample_rate: int
+) -> Tuple[np.ndarray, np.ndarray]:
+	"""
+	Only the active samples, back to back, and an (n, 2) array of where
+	each piece starts in them and in the recording, in seconds.
+	"""
+	bounds = (regions.astype(np.int64) * sample_rate) // 1000
+	bounds = np.minimum(bounds, len(samples))
+	pieces = [samples[begin:end] for begin, end in bounds]
+	lengths = np.array([len(piece) for piece in pieces], dtype=np.int64)
+	offsets = np.empty((len(pieces), 2), dtype=np.float64)
+	offsets[:, 0] = (np.cumsum(lengths) - lengths) / sample_rate
+	offsets[:, 1] = bounds[:, 0] / sample_rate
+	if not pieces:
+		return np.empty(0, dtype=samples.dtype), offsets
+	return np.concatenate(pieces), offsets
+
+
+def realign(seconds: float, offsets: np.ndarray, end: bool = False) -> float:
+	"""
+	A time in the gathered audio back to a time in the recording. Where two
+	pieces meet, an end belongs to the first one and a start to the second.
+	"""
+	if seconds is None or not len(offsets):
+		return seconds
+	side = "left" if end else "right"
+	i = max(int(np.searchsorted(offsets[:, 0], seconds, side=side)) - 1, 0)
+	return float(offsets[i, 1] + seconds - offsets[i, 0])
@@ -0,0 +1,55 @@
+import os
+from typing import Dict
+
+import numpy as np
+
+# resolution name -> seconds per point, each one a multiple of the first
+RESOLUTIONS = {"10ms": 0.01, "1s": 1.0, "1min": 60.0}
+FINEST = "10ms"
+# columns of every level, the same as the first two of jobs.audio_features
+RMS, PEAK = 0, 1
+
+
+def level_path(directory: str, recording_id: str, resolution: str) -> str:
+	return os.path.join(directory, str(recording_id), f"{resolution}.npy")
+
+
+def downsample(level: np.ndarray, factor: int) -> np.ndarray:
+	"""
+	Every factor points merged into one. RMS is merged through the mean
+	square, so it is the same as computing it from the samples, a shorter
+	last point included.
+	"""
+	if not len(level):
+		return np.empty((0, 2), dtype=np.float32)
+	starts = np.arange(0, len(level), factor)
+	counts = np.diff(np.append(starts, len(level)))
+	squares = np.square(level[:, RMS], dtype=np.float32)
+	ret = np.empty((len(starts), 2), dtype=np.float32)
+	ret[:, RMS] = np.sqrt(np.add.reduceat(squares, starts) / counts)
+	ret[:, PEAK] = np.maximum.reduceat(level[:, PEAK], starts)
+	return ret
+
+
+def pyramid(finest: np.ndarray) -> Dict[str, np.ndarray]:
+	"""Every resolution from the finest one, as float16 to go on disk."""
+	step = RESOLUTIONS[FINEST]
+	return {
+		name: downsample(finest, round(seconds / step)).astype(np.float16)
+		for name, seconds in RESOLUTIONS.items()
+	}
+
+
+def save(directory: str, recording_id: str, levels: Dict[str, np.ndarray]) -> None:
+	os.makedirs(os.path.join(directory, str(recording_id)), exist_ok=True)
+	for name, level in levels.items():
+		path = level_path(directory, recording_id, name)
+		# np.save adds .npy to names without it
+		temp_path = path + ".tmp.npy"
+		np.save(temp_path, level)
+		os.replace(temp_path, path)
+
+
+def load(directory: str, recording_id: str, resolution: str) -> np.ndarray:
+	# memory mapped, a slice only reads the pages it touches
+	return np.load(level_path(directory, recording_id, resolution), mmap_mode="r")
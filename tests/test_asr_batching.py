@@ -0,0 +1,113 @@
+import numpy as np
+
+import vad
+from jobs import asr_batching
+
+
+def test_split_chunks():
+	rate = 100
+	samples = np.arange(300 * rate, dtype=np.float32)
+	regions = np.array([[0, 10000], [20000, 35000], [100000, 175000]], dtype=np.uint32)
+	chunks = asr_batching.split_chunks(samples, regions, rate, 30.0)
+
+	# the first two regions fit in one chunk, the 75s one is cut in three
+	assert [len(audio) / rate for audio, _ in chunks] == [25.0, 25.0, 25.0, 25.0]
+	audio, offsets = chunks[0]
+	assert vad.realign(12.0, offsets) == 22.0
+	assert audio[10 * rate] == 20 * rate
+	assert vad.realign(0.0, chunks[3][1]) == 150.0
+
+	whole = asr_batching.split_chunks(samples, None, rate, 30.0)
+	assert len(whole) == 10
+
+
+def test_split_chunks_overlap():
+	rate = 100
+	samples = np.arange(100 * rate, dtype=np.float32)
+	chunks = asr_batching.split_chunks(samples, None, rate, 30.0, 6.0)
+
+	# each one starts 6s before the last one ended
+	spans = [asr_batching.chunk_span(audio, offsets, rate) for audio, offsets in chunks]
+	assert spans == [(0.0, 29.5), (23.5, 53.0), (47.0, 76.5), (70.5, 100.0)]
+	assert chunks[1][0][0] == 23.5 * rate
+
+
+def test_batch_scheduler():
+	now = [0.0]
+	scheduler = asr_batching.BatchScheduler(3, 2.0, clock=lambda: now[0])
+	assert scheduler.timeout() is None
+	for i in range(4):
+		scheduler.add(i)
+	assert scheduler.next_batch() == [0, 1, 2]
+	# one left, not full and not due
+	assert scheduler.next_batch() == []
+	now[0] = 1.5
+	assert scheduler.timeout() == 0.5
+	now[0] = 2.0
+	assert scheduler.next_batch() == [3]
+	scheduler.add(4)
+	assert scheduler.next_batch(flush=True) == [4]
+	assert len(scheduler) == 0
+
+
+def test_stage_stats():
+	now = [0.0]
+	stats = asr_batching.StageStats("decode", workers=2, clock=lambda: now[0])
+	with stats.busy():
+		now[0] = 3.0
+	now[0] = 4.0
+	# 3 busy seconds out of 2 workers times 4 seconds
+	assert stats.utilization() == 3 / 8
+	assert str(stats) == "decode: 1 items, 38% busy"
+
+
+def test_shard():
+	items = [("a", 10), ("b", 60), ("c", 30), ("d", 30), ("e", 20)]
+	shards = asr_batching.shard(items, 2, lambda item: item[1])
+	assert shards == [[("b", 60), ("e", 20)], [("a", 10), ("c", 30), ("d", 30)]]
+	assert asr_batching.shard(items, 2, lambda item: item[1]) == shards
+	assert asr_batching.shard(items[:1], 3, lambda item: item[1]) == [
+		[("a", 10)],
+		[],
+		[],
+	]
+
+
+def test_overlapping_segments():
+	assert asr_batching.overlapping_segments(700, 300, 10) == [
+		(0, 300),
+		(290, 590),
+		(580, 700),
+	]
+	assert asr_batching.overlapping_segments(100, 300, 10) == [(0, 100)]
+
+
+def test_stitch():
+	segments = [
+		(0, 300, [(0.0, 280.0, " Hello there."), (280.0, 296.0, " How are you doing")]),
+		# the overlap is 290 to 300, cut at 295
+		(
+			290,
+			590,
+			[
+				(290.0, 294.0, " you doing"),
+				(295.5, 310.0, " are you doing today?"),
+				(310.0, None, " Fine."),
+			],
+		),
+	]
+	assert asr_batching.stitch(segments) == [
+		(0.0, 280.0, " Hello there."),
+		(280.0, 296.0, " How are you doing"),
+		(295.5, 310.0, " today?"),
+		(310.0, None, " Fine."),
+	]
+	# chunks that don't overlap were cut in silence, a repeat there was said twice
+	apart = [
+		(0, 20, [(1.0, 5.0, " No, no.")]),
+		(25, 40, [(26.0, 30.0, " No, no.")]),
+	]
+	assert asr_batching.stitch(apart) == [
+		(1.0, 5.0, " No, no."),
+		(26.0, 30.0, " No, no."),
+	]
@@ -0,0 +1,38 @@
+import numpy as np
+
+from jobs import audio_features
+
+
+def test_frame_features():
+	rate = audio_features.SAMPLE_RATE
+	t = np.arange(rate * 2, dtype=np.float32) / rate
+	tone = np.sin(2 * np.pi * 100 * t).astype(np.float32)
+	# a quiet first second, a loud second one
+	tone[:rate] *= 0.1
+	features = audio_features.frame_features(tone.reshape(2, rate))
+
+	assert np.allclose(
+		features[:, audio_features.RMS], [0.1, 1] / np.sqrt(2), atol=1e-3
+	)
+	assert np.allclose(features[:, audio_features.PEAK], [0.1, 1], atol=1e-3)
+	# 100Hz crosses zero 200 times a second
+	assert np.allclose(features[:, audio_features.ZCR] * (rate - 1), 200, atol=2)
+
+	changes = audio_features.change_scores(features)
+	assert changes.shape == (1,)
+	assert np.isclose(changes[0], 0.9 / np.sqrt(2), atol=1e-3)
+
+
+def test_decode_cache():
+	cache = audio_features.DecodeCache(3 * 400)
+	for key in "abc":
+		cache.put(key, np.zeros(100, dtype=np.float32))
+	assert cache.get("a") is not None
+	# b is the least recently used now
+	cache.put("d", np.zeros(100, dtype=np.float32))
+	assert cache.get("b") is None
+	assert cache.size == 3 * 400
+	# too big to keep at all
+	cache.put("e", np.zeros(1000, dtype=np.float32))
+	assert cache.get("e") is None
+	assert audio_features.DecodeCache(0).get("a") is None
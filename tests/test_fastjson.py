@@ -0,0 +1,26 @@
+import datetime
+import json
+import uuid
+
+import fastjson
+import schemas.recordings as schema
+
+
+def test_rows_match_pydantic():
+	row = {
+		"uuid": uuid.uuid4(),
+		"file_path": "2025-04-01_00-00-00.opus",
+		"begin_date": datetime.datetime(
+			2025, 4, 1, 0, 0, 0, 123456, tzinfo=datetime.timezone.utc
+		),
+		"audio_length": datetime.timedelta(minutes=58, seconds=1.5),
+		"source": "stationary",
+		"sha256sum": None,
+		"disk_usage": 1059756,
+	}
+	expected = schema.Recording.model_validate(row).model_dump_json()
+	assert fastjson.dumps(row) == expected.encode()
+
+	columns = fastjson.columns([tuple(row.values())], list(row))
+	assert columns["file_path"] == [row["file_path"]]
+	assert json.loads(fastjson.dumps(columns))["audio_length"] == [3481.5]
@@ -0,0 +1,139 @@
+import io
+import struct
+
+import ogg
+
+SERIAL = 1234
+PRE_SKIP = 312
+# 20ms opus packets
+PACKET_SAMPLES = 960
+
+
+def _reference_crc(data: bytes) -> int:
+	crc = 0
+	for byte in data:
+		crc ^= byte << 24
+		for _ in range(8):
+			if crc & 0x80000000:
+				crc = ((crc << 1) ^ 0x04C11DB7) & 0xFFFFFFFF
+			else:
+				crc = (crc << 1) & 0xFFFFFFFF
+	return crc
+
+
+def _page(header_type: int, granule: int, sequence: int, packets: list) -> bytes:
+	# a packet that is a multiple of 255 long continues on the next page
+	lacing = bytearray()
+	for packet in packets:
+		lacing += b"\xff" * (len(packet) // 255)
+		if len(packet) % 255:
+			lacing.append(len(packet) % 255)
+	body = b"".join(packets)
+	header = ogg.PAGE_HEADER.pack(
+		b"OggS", 0, header_type, granule, SERIAL, sequence, 0, len(lacing)
+	)
+	page = bytearray(header + lacing + body)
+	struct.pack_into("<I", page, ogg.CRC_OFFSET, _reference_crc(bytes(page)))
+	return bytes(page)
+
+
+def _opus_file(seconds: int) -> bytes:
+	head = b"OpusHead" + struct.pack("<BBHIhB", 1, 1, PRE_SKIP, 48000, 0, 0)
+	tags = b"OpusTags" + struct.pack("<I", 0) + struct.pack("<I", 0)
+	out = bytearray()
+	out += _page(0x02, 0, 0, [head])
+	out += _page(0, 0, 1, [tags])
+	granule = PRE_SKIP
+	sequence = 2
+	for second in range(seconds):
+		if second == 3:
+			# a packet split over two pages, page 4 is not a cut point
+			granule += 49 * PACKET_SAMPLES
+			out += _page(0, granule, sequence, [b"a" * 40] * 49 + [b"b" * 255])
+			sequence += 1
+			granule += 1 * PACKET_SAMPLES
+			out += _page(ogg.CONTINUED_PACKET, granule, sequence, [b"b" * 10])
+			sequence += 1
+			continue
+		granule += 50 * PACKET_SAMPLES
+		out += _page(0, granule, sequence, [b"a" * 40] * 50)
+		sequence += 1
+	return bytes(out)
+
+
+def test_page_crc_matches_reference():
+	data = _opus_file(2)
+	for page in ogg.iter_pages(io.BytesIO(data)):
+		stored = struct.unpack_from("<I", page.data, ogg.CRC_OFFSET)[0]
+		zeroed = bytearray(page.data)
+		struct.pack_into("<I", zeroed, ogg.CRC_OFFSET, 0)
+		assert ogg.page_crc(bytes(zeroed)) == stored
+
+
+def test_build_index():
+	data = _opus_file(10)
+	index = ogg.build_index(io.BytesIO(data))
+	assert index.pre_skip == PRE_SKIP
+	assert index.header_pages == 2
+	assert index.end_offset == len(data)
+	# 11 audio pages, the continued one is not a cut point
+	assert len(index.offsets) == 10
+	assert index.granules[0] == 0
+	assert index.granules[1] == PRE_SKIP + 48000
+	assert abs(index.duration - 10) < 1e-9
+
+	round_trip = ogg.OggIndex.from_bytes(index.to_bytes())
+	assert round_trip == index
+
+
+def test_iter_window():
+	data = _opus_file(10)
+	index = ogg.build_index(io.BytesIO(data))
+	out = b"".join(ogg.iter_window(io.BytesIO(data), index, 5.5, 2.0))
+
+	_begin, _, base = index.window(5.5, 2.0)
+	assert base / ogg.OPUS_SAMPLE_RATE <= 5.5
+	# the window starts with real audio, so nothing is skipped
+	assert ogg.build_index(io.BytesIO(out)).pre_skip == 0
+	head_end = len(next(ogg.iter_pages(io.BytesIO(data))).data)
+	assert out[head_end : index.header_end] == data[head_end : index.header_end]
+
+	pages = list(ogg.iter_pages(io.BytesIO(out)))
+	assert [p.sequence for p in pages] == list(range(len(pages)))
+	for page in pages:
+		zeroed = bytearray(page.data)
+		struct.pack_into("<I", zeroed, ogg.CRC_OFFSET, 0)
+		assert (
+			_reference_crc(bytes(zeroed))
+			== struct.unpack_from("<I", page.data, ogg.CRC_OFFSET)[0]
+		)
+
+	audio = pages[index.header_pages :]
+	assert audio[-1].header_type & ogg.END_OF_STREAM
+	assert not any(p.header_type & ogg.END_OF_STREAM for p in audio[:-1])
+	assert audio[0].granule == 50 * PACKET_SAMPLES
+	# covers the whole window, once pre skip has been dropped
+	end = (5.5 + 2.0) * ogg.OPUS_SAMPLE_RATE - base
+	assert audio[-1].granule - PRE_SKIP >= end
+	assert audio[-1].granule - PRE_SKIP < end + 48000
+
+
+def test_window_pre_skip():
+	data = _opus_file(10)
+	index = ogg.build_index(io.BytesIO(data))
+	# just past the start of the 6th second's page once pre skip counts,
+	# before it if it didn't
+	offset = (5 * 48000 + 100 + ogg.OPUS_PREROLL) / ogg.OPUS_SAMPLE_RATE
+	_, _, base = index.window(offset, 1.0)
+	assert base == PRE_SKIP + 5 * 48000
+	assert (base - index.pre_skip) / ogg.OPUS_SAMPLE_RATE == 5.0
+
+
+def test_iter_window_from_the_start():
+	data = _opus_file(3)
+	index = ogg.build_index(io.BytesIO(data))
+	out = b"".join(ogg.iter_window(io.BytesIO(data), index, 0, None))
+	pages = list(ogg.iter_pages(io.BytesIO(out)))
+	original = list(ogg.iter_pages(io.BytesIO(data)))
+	assert [p.granule for p in pages] == [p.granule for p in original]
+	assert len(out) == len(data)
@@ -0,0 +1,83 @@
+import asyncio
+import datetime
+
+import schemas.searches as searches
+import search_store
+
+T0 = datetime.datetime(2025, 4, 1, tzinfo=datetime.timezone.utc)
+
+
+def _update(hours: float, result: str) -> searches.SearchUpdate:
+	return searches.SearchUpdate(
+		prompt=searches.SearchPrompt(
+			prompt_timestamp=T0 + datetime.timedelta(hours=hours), play_request=None
+		),
+		result=result,
+	)
+
+
+def test_apply_update_narrows_bounds():
+	s = searches.Search()
+	for update in [
+		_update(2, "after"),
+		_update(8, "before"),
+		_update(1, "after"),
+		_update(9, "before"),
+		_update(5, "after"),
+	]:
+		search_store.apply_update(s, update)
+	assert s.current_lower_bound == T0 + datetime.timedelta(hours=5)
+	assert s.current_upper_bound == T0 + datetime.timedelta(hours=8)
+	assert s.search_status == "active"
+	assert len(s.updates) == 5
+
+	search_store.apply_update(s, _update(6, "exact"))
+	assert s.search_status == "completed"
+
+
+def test_in_memory_store():
+	async def run():
+		store = search_store.InMemorySearchStore()
+		done, idle, fresh = searches.Search(), searches.Search(), searches.Search()
+		for s in (done, idle, fresh):
+			await store.create(s)
+
+		assert await store.update("missing", lambda s: None) is None
+		updated = await store.update(
+			done.uuid, lambda s: search_store.apply_update(s, _update(1, "exact"))
+		)
+		assert updated.search_status == "completed"
+		assert [s.uuid for s in await store.list("completed")] == [done.uuid]
+		assert len(await store.list()) == 3
+
+		long_ago = datetime.datetime.now() - datetime.timedelta(hours=2)
+		done.updated_at = long_ago
+		idle.updated_at = long_ago
+		evicted = await store.evict(
+			datetime.timedelta(hours=1), datetime.timedelta(days=1)
+		)
+		assert evicted == 1
+		assert await store.get(done.uuid) is None
+		assert await store.get(idle.uuid) is idle
+
+		idle.updated_at -= datetime.timedelta(days=1)
+		await store.evict(datetime.timedelta(hours=1), datetime.timedelta(days=1))
+		assert [s.uuid for s in await store.list()] == [fresh.uuid]
+
+	asyncio.run(run())
+
+
+def test_apply_vote():
+	prompts = [_update(hours, "after").prompt for hours in (6, 2, 4)]
+	s = searches.Search()
+	search_store.apply_vote(s, searches.MultiSearchUpdate(prompts=prompts, interval=2))
+	assert s.current_lower_bound == T0 + datetime.timedelta(hours=4)
+	assert s.current_upper_bound == T0 + datetime.timedelta(hours=6)
+
+	search_store.apply_vote(s, searches.MultiSearchUpdate(prompts=prompts, interval=3))
+	assert s.current_lower_bound == T0 + datetime.timedelta(hours=6)
+	assert s.current_upper_bound == T0 + datetime.timedelta(hours=6)
+
+	search_store.apply_vote(s, searches.MultiSearchUpdate(prompts=prompts, exact=0))
+	assert s.search_status == "completed"
+	assert s.updates[-1].prompt.prompt_timestamp == T0 + datetime.timedelta(hours=2)
@@ -0,0 +1,151 @@
+import datetime
+
+import timeline as tl
+
+T0 = datetime.datetime(2025, 4, 1, tzinfo=datetime.timezone.utc)
+
+
+def _at(hours: float) -> datetime.datetime:
+	return T0 + datetime.timedelta(hours=hours)
+
+
+def _timeline() -> tl.RecordingTimeline:
+	timeline = tl.RecordingTimeline()
+	# added out of order on purpose, with a gap between 4h and 6h
+	timeline.add("c", "c.opus", _at(6), datetime.timedelta(hours=2), 30)
+	timeline.add("a", "a.opus", _at(0), datetime.timedelta(hours=2), 10)
+	timeline.add("b", "b.opus", _at(2), datetime.timedelta(hours=2), 20)
+	return timeline
+
+
+def test_covering():
+	timeline = _timeline()
+	assert timeline.covering(_at(0)).uuid == "a"
+	assert timeline.covering(_at(1.5)).uuid == "a"
+	assert timeline.covering(_at(2)).uuid == "b"
+	assert timeline.covering(_at(5)) is None
+	assert timeline.covering(_at(7.9)).uuid == "c"
+	assert timeline.covering(_at(8)) is None
+	assert timeline.covering(_at(-1)) is None
+
+
+def test_covering_overlapping_sources():
+	timeline = _timeline()
+	timeline.add("long", "long.opus", _at(4.5), datetime.timedelta(hours=3))
+	timeline.add("short", "short.opus", _at(5), datetime.timedelta(minutes=1))
+	assert timeline.covering(_at(5.5)).uuid == "long"
+
+
+def test_latest_before():
+	timeline = _timeline()
+	assert timeline.latest_before(_at(5)).uuid == "b"
+	assert timeline.latest_before(_at(2)).uuid == "a"
+	assert timeline.latest_before(_at(0)) is None
+
+
+def test_bounds_and_summary():
+	timeline = _timeline()
+	assert timeline.first_begin() == _at(0)
+	assert timeline.last_begin() == _at(6)
+	assert timeline.last_end() == _at(8)
+
+	summary = timeline.summary()
+	assert summary["number_of_recordings"] == 3
+	assert summary["sum_of_durations"] == datetime.timedelta(hours=6)
+	assert summary["total_disk_usage"] == 60
+
+	empty = tl.RecordingTimeline().summary()
+	assert empty["number_of_recordings"] == 0
+	assert empty["first_recording_begin"] is None
+
+
+def test_gaps():
+	timeline = _timeline()
+	assert timeline.gaps(_at(1), _at(7)) == [(_at(4), _at(6))]
+	assert timeline.gaps(_at(-1), _at(9)) == [
+		(_at(-1), _at(0)),
+		(_at(4), _at(6)),
+		(_at(8), _at(9)),
+	]
+	assert timeline.gaps(_at(1), _at(7), datetime.timedelta(hours=3)) == []
+
+
+def test_add_is_idempotent():
+	timeline = _timeline()
+	timeline.add("a", "a.opus", _at(0), datetime.timedelta(hours=2), 10)
+	assert len(timeline) == 3
+	assert timeline.get("a").file_path == "a.opus"
+
+
+def test_remove():
+	timeline = _timeline()
+	timeline.add("c2", "c2.opus", _at(6), datetime.timedelta(hours=1))
+	timeline.remove("c")
+	timeline.remove("missing")
+	assert len(timeline) == 3
+	assert timeline.get("c") is None
+	assert timeline.covering(_at(6.5)).uuid == "c2"
+	assert timeline.covering(_at(7.5)) is None
+	assert timeline.last_end() == _at(7)
+	assert timeline.summary()["total_disk_usage"] == 30
+	assert timeline.gaps(_at(1), _at(8)) == [(_at(4), _at(6)), (_at(7), _at(8))]
+
+	# an updated row is removed and added again
+	timeline.add("c", "c.opus", _at(6), datetime.timedelta(hours=2), 30, "abc")
+	assert timeline.get("c").sha256sum == "abc"
+	assert timeline.last_end() == _at(8)
+
+
+def test_recorded_seconds_skips_gaps():
+	timeline = _timeline()
+	hour = 3600.0
+	assert timeline.recorded_seconds(_at(-1)) == 0
+	assert timeline.recorded_seconds(_at(1)) == 1 * hour
+	assert timeline.recorded_seconds(_at(5)) == 4 * hour
+	assert timeline.recorded_seconds(_at(6)) == 4 * hour
+	assert timeline.recorded_seconds(_at(7)) == 5 * hour
+	assert timeline.recorded_seconds(_at(9)) == 6 * hour
+
+	assert timeline.at_recorded_seconds(1 * hour) == _at(1)
+	assert timeline.at_recorded_seconds(4 * hour) == _at(6)
+	assert timeline.at_recorded_seconds(5 * hour) == _at(7)
+
+
+def test_recorded_midpoint_lands_in_audio():
+	timeline = _timeline()
+	# wall clock midpoint would be 5h, in the gap
+	mid = timeline.recorded_midpoint(_at(2), _at(8))
+	assert mid == _at(6)
+	assert timeline.covering(mid).uuid == "c"
+
+	for lower, upper in [(_at(3), _at(7)), (_at(3.9), _at(6.1)), (_at(-5), _at(20))]:
+		assert timeline.covering(timeline.recorded_midpoint(lower, upper))
+
+	assert timeline.recorded_midpoint(_at(4.5), _at(5.5)) is None
+
+
+def test_pieces():
+	timeline = _timeline()
+	pieces = [
+		(interval.uuid if interval else None, begin, end)
+		for interval, begin, end in timeline.pieces(_at(1), _at(7))
+	]
+	assert pieces == [
+		("a", _at(1), _at(2)),
+		("b", _at(2), _at(4)),
+		(None, _at(4), _at(6)),
+		("c", _at(6), _at(7)),
+	]
+
+	timeline.add("overlap", "overlap.opus", _at(3), datetime.timedelta(hours=2))
+	pieces = [
+		(interval.uuid if interval else None, begin, end)
+		for interval, begin, end in timeline.pieces(_at(3.5), _at(9))
+	]
+	assert pieces == [
+		("b", _at(3.5), _at(4)),
+		("overlap", _at(4), _at(5)),
+		(None, _at(5), _at(6)),
+		("c", _at(6), _at(8)),
+		(None, _at(8), _at(9)),
+	]
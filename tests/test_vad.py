@@ -0,0 +1,63 @@
+import numpy as np
+
+import vad
+
+
+def test_detect():
+	frame = vad.FRAME_SECONDS
+	rms = np.full(round(60 / frame), 1e-4, dtype=np.float32)
+	# talk from 9s to 18s, another burst 0.6s later, a click at 30s
+	rms[300:600] = 0.1
+	rms[620:680] = 0.1
+	rms[1000] = 0.5
+	regions = vad.detect(rms)
+
+	assert regions.dtype == np.uint32
+	assert regions.tolist() == [[8700, 20700]]
+	assert np.array_equal(vad.from_bytes(vad.to_bytes(regions)), regions)
+	assert vad.detect(np.zeros(100, dtype=np.float32)).shape == (0, 2)
+
+
+def test_snap():
+	regions = np.array([[10000, 20000], [60000, 70000]], dtype=np.uint32)
+	# inside, closer to the next start, closer to the previous end
+	assert vad.snap(regions, 15.0, 10.0) == 15.0
+	assert vad.snap(regions, 5.0, 10.0) == 10.0
+	assert vad.snap(regions, 50.0, 10.0) == 60.0
+	assert vad.snap(regions, 25.0, 3.0) == 17.0
+	assert vad.snap(regions, 90.0, 20.0) == 60.0
+	assert vad.snap(regions[:0], 90.0, 20.0) == 90.0
+
+
+def test_gather_realign():
+	rate = 100
+	samples = np.arange(100 * rate, dtype=np.float32)
+	regions = np.array([[10000, 20000], [60000, 70000]], dtype=np.uint32)
+	audio, offsets = vad.gather(samples, regions, rate)
+
+	assert len(audio) == 20 * rate
+	assert audio[10 * rate] == 60 * rate
+	assert vad.realign(5.0, offsets) == 15.0
+	assert vad.realign(10.0, offsets) == 60.0
+	assert vad.realign(10.0, offsets, end=True) == 20.0
+	assert vad.realign(None, offsets) is None
+
+
+def test_clip():
+	regions = np.array([[10000, 20000], [60000, 70000]], dtype=np.uint32)
+	assert vad.clip(regions, 15000, 65000).tolist() == [[0, 5000], [45000, 50000]]
+	assert vad.clip(regions, 20000, 60000).shape == (0, 2)
+
+
+def test_keep_order():
+	regions = np.array([[0, 10000], [20000, 30000]], dtype=np.uint32)
+	# 14s is right after the end of the first region, closer to it than
+	# to the next one, so on its own it snaps back before 9s
+	originals = [9.0, 14.0, 16.0]
+	snapped = [vad.snap(regions, t, 10.0) for t in originals]
+	assert snapped == [9.0, 0.0, 20.0]
+	assert vad.keep_order(originals, snapped, 0.0, 40.0) == [9.0, 14.0, 20.0]
+	# outside the bounds goes back, duplicates go
+	assert vad.keep_order([5.0, 6.0], [6.0, 6.0], 0.0, 40.0) == [5.0, 6.0]
+	assert vad.keep_order([5.0, 6.0], [5.5, 5.5], 0.0, 40.0) == [5.5, 6.0]
+	assert vad.keep_order([30.0], [45.0], 0.0, 40.0) == [30.0]
@@ -0,0 +1,38 @@
+import numpy as np
+
+import waveform
+from jobs import audio_features
+
+
+def test_envelope_and_pyramid():
+	rate = audio_features.SAMPLE_RATE
+	t = np.arange(rate * 150, dtype=np.float32) / rate
+	samples = (0.5 * np.sin(2 * np.pi * 440 * t)).astype(np.float32)
+	# a silent second minute
+	samples[rate * 60 : rate * 120] = 0
+
+	features = audio_features.frame_features(samples.reshape(-1, rate // 100))
+	assert features.shape == (15000, audio_features.NUM_FEATURES)
+	levels = waveform.pyramid(features[:, [audio_features.RMS, audio_features.PEAK]])
+	assert {name: len(level) for name, level in levels.items()} == {
+		"10ms": 15000,
+		"1s": 150,
+		"1min": 3,
+	}
+	assert all(level.dtype == np.float16 for level in levels.values())
+
+	seconds = levels["1s"].astype(np.float32)
+	assert np.allclose(seconds[:60, waveform.RMS], 0.5 / np.sqrt(2), atol=1e-3)
+	assert np.allclose(seconds[:60, waveform.PEAK], 0.5, atol=1e-3)
+	assert not seconds[60:120].any()
+
+	# the last minute is only half as long, and still exact
+	minutes = levels["1min"].astype(np.float32)
+	assert np.allclose(minutes[:, waveform.RMS], [0.3536, 0, 0.3536], atol=1e-3)
+
+
+def test_downsample_merges_mean_squares():
+	level = np.array([[3, 3], [4, 5], [0, 0]], dtype=np.float32)
+	merged = waveform.downsample(level, 2)
+	assert np.allclose(merged[0], [np.sqrt((9 + 16) / 2), 5])
+	assert np.allclose(merged[1], [0, 0])